@@ -0,0 +1,166 @@
+"""
+A cache of the occurrences of periods shared between requests.
+
+The occurrences of a period are stored under a key made of the query of its
+events, its bounds, its time zone and the generations of the calendars its
+events belong to. Saving or deleting anything that changes the occurrences of
+a calendar bumps its generation, so that the entries computed before are
+never read again and expire on their own.
+"""
+import hashlib
+import time
+
+from django.core.cache import caches
+from django.db.models.sql.datastructures import EmptyResultSet
+
+from events.settings import PERIOD_CACHE_ALIAS, PERIOD_CACHE_TIMEOUT, PERIOD_CACHE_LOCK_TIMEOUT
+
+
+class PeriodCache(object):
+    """
+    Stores the occurrence lists of periods in the Django cache ``alias``.
+
+    When an entry is missing, the first request to notice takes a lock and
+    computes it, while the other ones wait up to ``lock_timeout`` seconds for
+    it to show up instead of computing it again. If it can't be stored, the
+    lock is replaced by a marker for ``lock_timeout`` seconds, during which
+    requests compute the entry without waiting.
+    """
+    key_prefix = 'events:period'
+    poll_interval = 0.05
+    # Left in place of the lock of an entry that could not be stored, because
+    # its computation failed or was cut short by the expansion budget.
+    uncacheable = 'uncacheable'
+
+    def __init__(self, alias, timeout=PERIOD_CACHE_TIMEOUT, lock_timeout=PERIOD_CACHE_LOCK_TIMEOUT):
+        self.alias = alias
+        self.timeout = timeout
+        self.lock_timeout = lock_timeout
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def generation_key(self, calendar_id):
+        return '%s:generation:%s' % (self.key_prefix, calendar_id)
+
+    def _initial_generation(self):
+        # Generations start from the clock, so that a generation lost by the
+        # cache does not start again from a value used before.
+        return int(time.time() * 1000)
+
+    def get_generations(self, calendar_ids):
+        """
+        Returns the ``(calendar_id, generation)`` pairs of ``calendar_ids``.
+        """
+        keys = dict((self.generation_key(pk), pk) for pk in calendar_ids)
+        found = self.cache.get_many(list(keys))
+        generations = []
+        for key, pk in keys.items():
+            generation = found.get(key)
+            if generation is None:
+                self.cache.add(key, self._initial_generation(), None)
+                generation = self.cache.get(key)
+            generations.append((pk, generation))
+        return sorted(generations)
+
+    def bump(self, calendar_ids):
+        """
+        Invalidates the cached periods of the calendars ``calendar_ids``.
+        """
+        for pk in set(calendar_ids):
+            key = self.generation_key(pk)
+            try:
+                self.cache.incr(key)
+            except ValueError:
+                self.cache.add(key, self._initial_generation(), None)
+
+    def make_key(self, period, kind='occurrences'):
+        """
+        Returns the key of the occurrences of ``period``, or of what ``kind``
+        names. Raises ``EmptyResultSet`` if its events can't match anything.
+        """
+        events = period.events
+        calendar_ids = events.order_by().values_list('calendar_id', flat=True).distinct()
+        parts = (
+            kind,
+            str(events.query),
+            period.utc_start.isoformat(),
+            period.utc_end.isoformat(),
+            getattr(period.tzinfo, 'zone', period.tzinfo),
+            self.get_generations(calendar_ids),
+        )
+        digest = hashlib.md5(repr(parts).encode('utf-8')).hexdigest()
+        return '%s:%s' % (self.key_prefix, digest)
+
+    def get_occurrences(self, period, compute):
+        """
+        Returns the cached occurrences of ``period``, calling ``compute`` to
+        get them if they are not cached yet. Occurrences cut short by the
+        expansion budget are not cached, and the requests waiting for them
+        compute them too instead of waiting for the lock to expire.
+        """
+        return self.get(period, compute, 'occurrences')
+
+    def get_busy_days(self, period, compute):
+        """
+        Returns the cached busy days bitset of ``period``, calling ``compute``
+        to get it if it is not cached yet.
+        """
+        return self.get(period, compute, 'busy_days')
+
+    def peek(self, period, kind='occurrences'):
+        """
+        Returns what ``kind`` names for ``period`` if it is cached, ``None``
+        otherwise, without computing it or waiting for it.
+        """
+        try:
+            return self.cache.get(self.make_key(period, kind))
+        except EmptyResultSet:
+            return None
+
+    def get(self, period, compute, kind):
+        """
+        Returns what ``kind`` names for ``period`` from the cache, computing
+        it under a lock when it is missing.
+        """
+        try:
+            key = self.make_key(period, kind)
+        except EmptyResultSet:
+            return compute()
+        cache = self.cache
+        value = cache.get(key)
+        if value is not None:
+            return value
+
+        lock = '%s:lock' % key
+        if cache.add(lock, True, self.lock_timeout):
+            stored = False
+            try:
+                value = compute()
+                if not getattr(period, 'truncated', False):
+                    cache.set(key, value, self.timeout)
+                    stored = True
+            finally:
+                if stored:
+                    cache.delete(lock)
+                else:
+                    # tell the requests waiting for the entry that it won't
+                    # show up, so that they compute it right away
+                    cache.set(lock, self.uncacheable, self.lock_timeout)
+            return value
+
+        deadline = time.time() + self.lock_timeout
+        while time.time() < deadline:
+            value = cache.get(key)
+            if value is not None:
+                return value
+            if cache.get(lock) in (None, self.uncacheable):
+                break
+            time.sleep(self.poll_interval)
+        value = cache.get(key)
+        if value is not None:
+            return value
+        return compute()
+
+period_cache = PeriodCache(PERIOD_CACHE_ALIAS) if PERIOD_CACHE_ALIAS else None
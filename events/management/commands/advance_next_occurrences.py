@@ -0,0 +1,14 @@
+from django.core.management.base import NoArgsCommand
+from django.utils import timezone
+
+
+class Command(NoArgsCommand):
+    help = "Moves the stored next occurrence of events past the ones that are over. Run it once a day."
+
+    def handle_noargs(self, **options):
+        from events.models import Event
+        from events.models.event import NEXT_OCCURRENCE_MARGIN
+
+        after = timezone.now() - NEXT_OCCURRENCE_MARGIN
+        for event in Event.objects.filter(next_occurrence_end__lte=after).select_related('rule'):
+            event.update_next_occurrence(after)
@@ -0,0 +1,11 @@
+from django.core.management.base import NoArgsCommand
+
+
+class Command(NoArgsCommand):
+    help = "Rolls the materialized occurrence index forward. Run it once a day."
+
+    def handle_noargs(self, **options):
+        from events.models import Event, OccurrenceIndex
+
+        for event in Event.objects.select_related('rule').prefetch_related('occurrence_set'):
+            OccurrenceIndex.objects.index_event(event)
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OccurrenceIndex',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('start', models.DateTimeField(verbose_name='start')),
+                ('end', models.DateTimeField(verbose_name='end')),
+                ('original_start', models.DateTimeField(verbose_name='original start')),
+                ('original_end', models.DateTimeField(verbose_name='original end')),
+                ('cancelled', models.BooleanField(default=False, verbose_name='cancelled')),
+                ('event', models.ForeignKey(verbose_name='event', to='events.Event')),
+                ('occurrence', models.ForeignKey(on_delete=django.db.models.deletion.SET_NULL, verbose_name='occurrence', blank=True, to='events.Occurrence', null=True)),
+            ],
+            options={
+                'verbose_name': 'occurrence index',
+                'verbose_name_plural': 'occurrence index',
+            },
+            bases=(models.Model,),
+        ),
+        migrations.AlterIndexTogether(
+            name='occurrenceindex',
+            index_together=set([('start', 'end')]),
+        ),
+    ]
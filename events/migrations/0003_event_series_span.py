@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import datetime
+
+from dateutil import rrule
+from django.db import models, migrations
+from django.db.models import Min, Max
+
+# The helpers below are frozen copies of those of events.models.rules and
+# events.recurrence, so that changing them doesn't change this migration.
+FIXED_STEPS = {
+    'WEEKLY': datetime.timedelta(weeks=1),
+    'DAILY': datetime.timedelta(days=1),
+    'HOURLY': datetime.timedelta(hours=1),
+    'MINUTELY': datetime.timedelta(minutes=1),
+    'SECONDLY': datetime.timedelta(seconds=1),
+}
+
+
+def parse_params(paramstring):
+    params = {}
+    for param in paramstring.split(';'):
+        param = param.split(':')
+        if len(param) == 2:
+            values = [int(p) for p in param[1].split(',')]
+            params[str(param[0])] = values[0] if len(values) == 1 else values
+    return params
+
+
+def microseconds(delta):
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+def series_span(frequency, params, dtstart, duration, until=None):
+    rule = rrule.rrule(getattr(rrule, frequency), dtstart=dtstart, **params)
+    # rrule drops the microseconds of dtstart
+    dtstart = dtstart.replace(microsecond=0)
+    first = rule.after(dtstart, inc=True)
+    if first is None or (until is not None and first > until):
+        return None, None
+    count = params.get('count')
+    if count is None and until is None:
+        return first, None
+    if frequency in FIXED_STEPS and set(params) <= set(['interval', 'count']):
+        step = FIXED_STEPS[frequency] * params.get('interval', 1)
+        index = None if count is None else count - 1
+        if until is not None:
+            before_until = microseconds(until - dtstart) // microseconds(step)
+            index = before_until if index is None else min(index, before_until)
+        last = dtstart + step * index
+    elif until is not None:
+        last = rule.before(until, inc=True)
+    else:
+        last = rule[-1]
+    return first, last + duration
+
+
+def compute_series_spans(apps, schema_editor):
+    Event = apps.get_model('events', 'Event')
+    Occurrence = apps.get_model('events', 'Occurrence')
+    for event in Event.objects.select_related('rule'):
+        if event.rule is None:
+            first, last = event.start, event.end
+        else:
+            first, last = series_span(
+                event.rule.frequency, parse_params(event.rule.params or ''),
+                event.start, event.end - event.start, event.end_recurring_period)
+        persisted = Occurrence.objects.filter(event=event).aggregate(first=Min('start'), last=Max('end'))
+        if first is not None and persisted['first'] is not None:
+            first = min(first, persisted['first'])
+            if last is not None:
+                last = max(last, persisted['last'])
+        Event.objects.filter(pk=event.pk).update(first_occurrence_start=first, last_occurrence_end=last)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0002_occurrenceindex'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='first_occurrence_start',
+            field=models.DateTimeField(verbose_name='first occurrence start', null=True, editable=False, blank=True),
+            preserve_default=True,
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='last_occurrence_end',
+            field=models.DateTimeField(help_text='Empty if the event repeats forever.', verbose_name='last occurrence end', null=True, editable=False, blank=True),
+            preserve_default=True,
+        ),
+        migrations.RunPython(compute_series_spans, migrations.RunPython.noop),
+    ]
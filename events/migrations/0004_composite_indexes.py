@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+def check_duplicate_occurrences(apps, schema_editor):
+    """
+    Stops the migration if several persisted occurrences share an event and
+    an original start, since the unique constraint can't be created then.
+    Which of them to keep is left to the site administrators.
+    """
+    Occurrence = apps.get_model('events', 'Occurrence')
+    duplicates = Occurrence.objects.values('event', 'original_start').annotate(
+        total=models.Count('id')).filter(total__gt=1).order_by('event', 'original_start')
+    if duplicates:
+        lines = []
+        for duplicate in duplicates:
+            ids = Occurrence.objects.filter(
+                event=duplicate['event'],
+                original_start=duplicate['original_start'],
+            ).order_by('id').values_list('id', flat=True)
+            lines.append('  event %s, original start %s: occurrences %s' % (
+                duplicate['event'], duplicate['original_start'], ', '.join(str(pk) for pk in ids)))
+        raise RuntimeError(
+            'Several persisted occurrences have the same event and original start. '
+            'Delete or merge them so that only one is left for each, then run the '
+            'migration again:\n%s' % '\n'.join(lines))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0001_initial'),
+        ('events', '0003_event_series_span'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicate_occurrences, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='occurrence',
+            unique_together=set([('event', 'original_start')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='event',
+            index_together=set([('calendar', 'start'), ('calendar', 'end')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='eventrelation',
+            index_together=set([('content_type', 'object_id', 'distinction')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='calendarrelation',
+            index_together=set([('content_type', 'object_id', 'distinction')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='occurrenceindex',
+            index_together=set([('start', 'end'), ('event', 'original_start')]),
+        ),
+    ]
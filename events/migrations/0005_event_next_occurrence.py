@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import datetime
+
+from dateutil import rrule
+from django.db import models, migrations
+from django.utils import timezone
+
+# Frozen copies of events.models.event.NEXT_OCCURRENCE_MARGIN and of the
+# helpers of events.models.rules and events.recurrence, so that changing
+# them doesn't change this migration.
+NEXT_OCCURRENCE_MARGIN = datetime.timedelta(days=1)
+
+
+def parse_params(paramstring):
+    params = {}
+    for param in paramstring.split(';'):
+        param = param.split(':')
+        if len(param) == 2:
+            values = [int(p) for p in param[1].split(',')]
+            params[str(param[0])] = values[0] if len(values) == 1 else values
+    return params
+
+
+def compile_rrule(frequency, params, dtstart):
+    return rrule.rrule(getattr(rrule, frequency), dtstart=dtstart, **params)
+
+
+def compute_next_occurrences(apps, schema_editor):
+    Event = apps.get_model('events', 'Event')
+    after = timezone.now() - NEXT_OCCURRENCE_MARGIN
+    for event in Event.objects.select_related('rule'):
+        duration = event.end - event.start
+        if event.rule is None:
+            start = event.start if event.end > after else None
+        else:
+            rule = compile_rrule(event.rule.frequency, parse_params(event.rule.params or ''), event.start)
+            start = rule.after(after - duration)
+            if start is not None and event.end_recurring_period and start > event.end_recurring_period:
+                start = None
+        end = start + duration if start is not None else None
+        Event.objects.filter(pk=event.pk).update(next_occurrence_start=start, next_occurrence_end=end)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0004_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='next_occurrence_start',
+            field=models.DateTimeField(help_text='Empty once the event has no occurrence to come.', verbose_name='next occurrence start', null=True, editable=False, blank=True, db_index=True),
+            preserve_default=True,
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='next_occurrence_end',
+            field=models.DateTimeField(verbose_name='next occurrence end', null=True, editable=False, blank=True),
+            preserve_default=True,
+        ),
+        migrations.RunPython(compute_next_occurrences, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,6 @@
 from events.models.calendars import Calendar, CalendarRelation  # NOQA
-from events.models.event import Event, EventRelation, Occurrence  # NOQA
+from events.models.event import Event, EventRelation, Occurrence, OccurrenceView  # NOQA
 from events.models.rules import *
+from events.models.occurrence_index import OccurrenceIndex  # NOQA
 
 from events.signals import optionnal_calendar  # NOQA
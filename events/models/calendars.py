@@ -285,6 +285,7 @@ class CalendarRelation(with_metaclass(ModelBase, *get_model_bases())):
         verbose_name = _('calendar relation')
         verbose_name_plural = _('calendar relations')
         app_label = 'events'
+        index_together = (('content_type', 'object_id', 'distinction'), )
 
     def __str__(self):
         return u'%s - %s' % (self.calendar, self.content_object)
@@ -16,24 +16,50 @@ from django.contrib.sites.models import Site
 from django.core.urlresolvers import reverse
 from django.db import models
 from django.db.models.base import ModelBase
-from django.db.models import Q
+from django.db.models import Q, Min, Max
 from django.template.defaultfilters import date, urlencode
 from django.utils.translation import ugettext, ugettext_lazy as _
 from django.utils import timezone
 from django.utils.encoding import python_2_unicode_compatible
 
-from dateutil import rrule
-
 from bitfield import BitField
 from audience.settings import AUDIENCE_FLAGS
 
+from ..recurrence import ExpansionBudget, RuleSeeker, expansion_memo, rrule_cache, series_span
 from ..settings import RELATIONS
 from ..utils import get_model_bases
 
 AUTH_USER_MODEL = getattr(settings, 'AUTH_USER_MODEL', 'auth.User')
 
+# The next occurrence of an event is stored as the first one ending after this
+# long before it is computed, so that it bounds the generated occurrences
+# after any datetime since then.
+NEXT_OCCURRENCE_MARGIN = datetime.timedelta(days=1)
+
+
+class EventQuerySet(models.QuerySet):
+    def possibly_overlapping(self, start, end=None):
+        """
+        Excludes the events that cannot have an occurrence overlapping
+        ``[start, end)``, using their persisted series span. Leave ``end`` out
+        for an open ended range.
+        """
+        q = Q(last_occurrence_end__isnull=True) | Q(last_occurrence_end__gte=start)
+        if end is not None:
+            q &= Q(first_occurrence_start__isnull=True) | Q(first_occurrence_start__lt=end)
+        return self.filter(q)
 
-class EventManager(models.Manager):
+    def upcoming(self):
+        """
+        Returns the events that still have an occurrence to come, ordered by
+        their persisted next occurrence start, before which none of their
+        generated occurrences ending after ``now - NEXT_OCCURRENCE_MARGIN``
+        starts. Moved persisted occurrences may start before it.
+        """
+        return self.filter(next_occurrence_start__isnull=False).order_by('next_occurrence_start')
+
+
+class EventManager(models.Manager.from_queryset(EventQuerySet)):
     def get_for_object(self, content_object, distinction=None, inherit=True):
         return EventRelation.objects.get_events_for_object(content_object, distinction, inherit)
 
@@ -72,6 +98,20 @@ class Event(with_metaclass(ModelBase, *get_model_bases())):
     calendar = models.ForeignKey(
         'events.Calendar',
         related_name="events")
+    first_occurrence_start = models.DateTimeField(
+        _("first occurrence start"),
+        null=True, blank=True, editable=False)
+    last_occurrence_end = models.DateTimeField(
+        _("last occurrence end"),
+        null=True, blank=True, editable=False,
+        help_text=_("Empty if the event repeats forever."))
+    next_occurrence_start = models.DateTimeField(
+        _("next occurrence start"),
+        null=True, blank=True, editable=False, db_index=True,
+        help_text=_("Empty once the event has no occurrence to come."))
+    next_occurrence_end = models.DateTimeField(
+        _("next occurrence end"),
+        null=True, blank=True, editable=False)
     objects = EventManager()
 
     class Meta(object):
@@ -79,6 +119,7 @@ class Event(with_metaclass(ModelBase, *get_model_bases())):
         verbose_name_plural = _('events')
         app_label = 'events'
         get_latest_by = 'start'
+        index_together = (('calendar', 'start'), ('calendar', 'end'))
 
     def __str__(self):
         date_format = u'l, %s' % settings.DATE_FORMAT
@@ -93,8 +134,85 @@ class Event(with_metaclass(ModelBase, *get_model_bases())):
         if self.all_day:
             self.start = datetime.datetime.combine(self.start, datetime.time.min)
             self.end = datetime.datetime.combine(self.end, datetime.time.max)
+        seeker = self._build_rule_seeker()
+        self.first_occurrence_start, self.last_occurrence_end = self.get_series_span(seeker)
+        self.next_occurrence_start, self.next_occurrence_end = self.get_next_occurrence_span(seeker=seeker)
         super(Event, self).save(*args, **kwargs)
 
+    def get_series_span(self, seeker=None):
+        """
+        Returns the start of the first occurrence and the end of the last one,
+        persisted occurrences included. The end is ``None`` if the event
+        repeats forever.
+
+        The rule is expanded with ``seeker``, which defaults to a new
+        ``RuleSeeker`` so that saving events doesn't fill ``rrule_cache``.
+        """
+        if self.rule is None:
+            first, last = self.start, self.end
+        else:
+            first, last = series_span(
+                seeker or self._build_rule_seeker(),
+                self.end - self.start,
+                self.end_recurring_period)
+        if self.pk is not None and first is not None:
+            persisted = self.occurrence_set.aggregate(first=Min('start'), last=Max('end'))
+            if persisted['first'] is not None:
+                first = min(first, persisted['first'])
+                if last is not None:
+                    last = max(last, persisted['last'])
+        return first, last
+
+    def widen_series_span(self, occurrence):
+        """
+        Stores a series span that also covers the persisted ``occurrence``,
+        without expanding the rule again.
+        """
+        changes = {}
+        if self.first_occurrence_start is not None and occurrence.start < self.first_occurrence_start:
+            changes['first_occurrence_start'] = self.first_occurrence_start = occurrence.start
+        if self.last_occurrence_end is not None and occurrence.end > self.last_occurrence_end:
+            changes['last_occurrence_end'] = self.last_occurrence_end = occurrence.end
+        if changes:
+            Event.objects.filter(pk=self.pk).update(**changes)
+
+    def update_series_span(self, seeker=None):
+        """
+        Recomputes and stores the series span without saving the whole event.
+        """
+        self.first_occurrence_start, self.last_occurrence_end = self.get_series_span(seeker)
+        Event.objects.filter(pk=self.pk).update(
+            first_occurrence_start=self.first_occurrence_start,
+            last_occurrence_end=self.last_occurrence_end)
+
+    def get_next_occurrence_span(self, after=None, seeker=None):
+        """
+        Returns the start and end of the first occurrence generated for this
+        event that ends after ``after``, which defaults to
+        ``NEXT_OCCURRENCE_MARGIN`` before now, or ``(None, None)`` if there is
+        none. Persisted occurrences are left out: the start bounds the
+        generated occurrences ``occurrences_after`` replaces them in, and it
+        reads the moved ones separately.
+
+        As with ``get_series_span``, ``seeker`` defaults to a new
+        ``RuleSeeker``.
+        """
+        if after is None:
+            after = timezone.now() - NEXT_OCCURRENCE_MARGIN
+        for occurrence in self._occurrences_after_generator(after, seeker or self._build_rule_seeker()):
+            return occurrence.start, occurrence.end
+        return None, None
+
+    def update_next_occurrence(self, after=None, seeker=None):
+        """
+        Recomputes and stores the next occurrence without saving the whole
+        event.
+        """
+        self.next_occurrence_start, self.next_occurrence_end = self.get_next_occurrence_span(after, seeker)
+        Event.objects.filter(pk=self.pk).update(
+            next_occurrence_start=self.next_occurrence_start,
+            next_occurrence_end=self.next_occurrence_end)
+
     def get_absolute_url(self):
         return reverse('event', args=[self.id])
 
@@ -104,7 +222,7 @@ class Event(with_metaclass(ModelBase, *get_model_bases())):
         """
         EventRelation.objects.create_relation(self, obj, distinction)
 
-    def get_occurrences(self, start, end, boost=True):
+    def get_occurrences(self, start, end, boost=True, budget=None):
         """
         >>> rule = Rule(frequency = "MONTHLY", name = "Monthly")
         >>> rule.save()
@@ -122,15 +240,27 @@ class Event(with_metaclass(ModelBase, *get_model_bases())):
         >>> ["%s to %s" %(o.start, o.end) for o in occurrences]
         []
 
+        The occurrences are cut short once they exceed the ``budget``, an
+        ``ExpansionBudget`` which defaults to one with the limits of the
+        settings.
+        """
+        return self._replace_persisted(self._get_occurrence_list(start, end, budget), start, end, boost)
+
+    def _replace_persisted(self, occurrences, start, end, boost=True, persisted_occurrences=None):
+        """
+        Replaces the generated ``occurrences`` of this event in the period
+        ``[start, end)`` with their persisted counterparts, which are looked
+        up unless ``persisted_occurrences`` is given.
         """
         from events.utils import OccurrenceReplacer
-        if self.pk and boost:
-            # performance booster for occurrences relationship, unless you have
-            # already selected several in a QuerySet. Then this slows performance.
-            Event.objects.select_related('occurrence').get(pk=self.pk)
-        persisted_occurrences = self.occurrence_set.all()
+        if persisted_occurrences is None and self.pk and boost:
+            # only load the persisted occurrences that matter for this period,
+            # unless they have already been prefetched for several events in a
+            # QuerySet.
+            persisted_occurrences = self.occurrence_set.in_window(start, end)
+        elif persisted_occurrences is None:
+            persisted_occurrences = self.occurrence_set.all()
         occ_replacer = OccurrenceReplacer(persisted_occurrences)
-        occurrences = self._get_occurrence_list(start, end)
         final_occurrences = []
         for occ in occurrences:
             # replace occurrences with their persisted counterparts
@@ -146,49 +276,138 @@ class Event(with_metaclass(ModelBase, *get_model_bases())):
         final_occurrences += occ_replacer.get_additional_occurrences(start, end)
         return final_occurrences
 
+    def count_between(self, start, end, cancelled=False, persisted_occurrences=None):
+        """
+        Returns how many occurrences ``get_occurrences(start, end)`` would
+        return, without creating them. Cancelled occurrences are only counted
+        if ``cancelled`` is true. The persisted occurrences of the period are
+        looked up unless ``persisted_occurrences`` is given.
+        """
+        duration = self.end - self.start
+        seeker = self.get_rule_seeker()
+        if seeker is None:
+            count = int(self.start < end and self.end >= start)
+        else:
+            count = expansion_memo.count(seeker, start, end, duration, self.end_recurring_period)
+        if persisted_occurrences is None:
+            persisted_occurrences = self.occurrence_set.in_window(start, end) if self.pk else []
+        for occurrence in persisted_occurrences:
+            replaces, shown = self._persisted_effect(occurrence, seeker, start, end, cancelled)
+            count += shown - replaces
+        return count
+
+    def iter_busy_days(self, days, cancelled=False, persisted_occurrences=None):
+        """
+        Yields the ``(first, last)`` indexes of the days during which the
+        occurrences of this event take place, without creating them. ``days``
+        holds the UTC boundaries of consecutive days, as returned by
+        ``Period.get_day_boundaries``. The expansion skips to the next day
+        once a day is known to be busy, so frequent rules cost at most one
+        step per day.
+        """
+        from events.ranges import day_span
+        start, end = days[0], days[-1]
+        duration = self.end - self.start
+        seeker = self.get_rule_seeker()
+        if persisted_occurrences is None:
+            persisted_occurrences = self.occurrence_set.in_window(start, end) if self.pk else []
+        replaced = set()
+        for occurrence in persisted_occurrences:
+            replaced.add((occurrence.original_start, occurrence.original_end))
+            if self._persisted_effect(occurrence, seeker, start, end, cancelled)[1]:
+                yield day_span(days, occurrence.start, occurrence.end)
+
+        if seeker is None:
+            if (self.start, self.end) not in replaced:
+                yield day_span(days, self.start, self.end)
+            return
+        day = 0
+        while day < len(days) - 1:
+            for o_start in expansion_memo.expand(seeker, days[day], end, duration, self.end_recurring_period):
+                if (o_start, o_start + duration) in replaced:
+                    continue
+                first, last = day_span(days, o_start, o_start + duration)
+                if first <= last and last >= day:
+                    break
+            else:
+                return
+            yield first, last
+            day = last + 1
+
+    def _persisted_effect(self, occurrence, seeker, start, end, cancelled):
+        """
+        Returns whether the persisted ``occurrence`` replaces a generated
+        occurrence in the period ``[start, end)`` and whether it shows in it.
+        """
+        replaces = (occurrence.original_start < end and occurrence.original_end >= start and
+                    occurrence.original_end - occurrence.original_start == self.end - self.start and
+                    self._generates(seeker, occurrence.original_start))
+        shown = (occurrence.start < end and occurrence.end >= start and
+                 (not occurrence.cancelled or (cancelled and replaces)))
+        return replaces, shown
+
+    def _generates(self, seeker, o_start):
+        """
+        Whether one of the generated occurrences of this event starts at
+        ``o_start``.
+        """
+        if seeker is None:
+            return o_start == self.start
+        if self.end_recurring_period and o_start > self.end_recurring_period:
+            return False
+        return seeker.after(o_start, inc=True) == o_start
+
     def get_rrule_object(self):
         if self.rule is not None:
-            params = self.rule.get_params()
-            frequency = rrule.__dict__[self.rule.frequency]
-            return rrule.rrule(frequency, dtstart=self.start, **params)
+            return rrule_cache.get_rrule(self.rule, self.start)
+
+    def get_rule_seeker(self):
+        """
+        Returns the cached ``RuleSeeker`` of the rule of this event, which
+        can start iterating at any date without walking the series from its
+        first occurrence.
+        """
+        if self.rule is not None:
+            return rrule_cache.get_seeker(self.rule, self.start)
+
+    def _build_rule_seeker(self):
+        """
+        Returns a ``RuleSeeker`` of the rule of this event that isn't kept in
+        ``rrule_cache``.
+        """
+        if self.rule is not None:
+            return RuleSeeker(self.rule.frequency, self.rule.get_params(), self.start)
 
     def _create_occurrence(self, start, end=None):
         if end is None:
             end = start + (self.end - self.start)
-        return Occurrence(event=self, start=start, end=end, original_start=start, original_end=end)
+        return OccurrenceView(self, start, end)
 
     def get_occurrence(self, date):
         if timezone.is_naive(date) and settings.USE_TZ:
             date = timezone.make_aware(date, timezone.utc)
-        rule = self.get_rrule_object()
-        if rule:
-            next_occurrence = rule.after(date, inc=True)
+        seeker = self.get_rule_seeker()
+        if seeker:
+            next_occurrence = seeker.after(date, inc=True)
         else:
             next_occurrence = self.start
         if next_occurrence == date:
             try:
                 return Occurrence.objects.get(event=self, original_start=date)
             except Occurrence.DoesNotExist:
-                return self._create_occurrence(next_occurrence)
+                return self._create_occurrence(next_occurrence).promote()
 
-    def _get_occurrence_list(self, start, end):
+    def _get_occurrence_list(self, start, end, budget=None):
         """
         returns a list of occurrences for this event from start to end.
         """
         difference = (self.end - self.start)
         if self.rule is not None:
-            occurrences = []
-            if self.end_recurring_period and self.end_recurring_period < end:
-                end = self.end_recurring_period
-            rule = self.get_rrule_object()
-            o_starts = []
-            o_starts.extend(rule.between(start, end, inc=True))
-            o_starts.extend(rule.between(start - (difference // 2), end - (difference // 2), inc=True))
-            o_starts.extend(rule.between(start - difference, end - difference, inc=True))
-            for o_start in o_starts:
-                o_end = o_start + difference
-                occurrences.append(self._create_occurrence(o_start, o_end))
-            return occurrences
+            if budget is None:
+                budget = ExpansionBudget()
+            o_starts = budget.take(expansion_memo.expand(self.get_rule_seeker(), start, end, difference,
+                                                         self.end_recurring_period))
+            return [self._create_occurrence(o_start, o_start + difference) for o_start in o_starts]
         else:
             # check if event is in the period
             if self.start < end and self.end >= start:
@@ -196,28 +415,26 @@ class Event(with_metaclass(ModelBase, *get_model_bases())):
             else:
                 return []
 
-    def _occurrences_after_generator(self, after=None):
+    def _occurrences_after_generator(self, after=None, seeker=None):
         """
         returns a generator that produces unpresisted occurrences after the
-        datetime ``after``.
+        datetime ``after``, expanding the rule with ``seeker`` if it is given.
         """
 
         if after is None:
             after = timezone.now()
-        rule = self.get_rrule_object()
-        if rule is None:
+        if seeker is None:
+            seeker = self.get_rule_seeker()
+        if seeker is None:
             if self.end > after:
                 yield self._create_occurrence(self.start, self.end)
             raise StopIteration
-        date_iter = iter(rule)
         difference = self.end - self.start
-        while True:
-            o_start = next(date_iter)
+        # the first occurrence ending after ``after`` starts after this
+        for o_start in seeker.iter_from(after - difference, inc=False):
             if self.end_recurring_period and o_start > self.end_recurring_period:
                 raise StopIteration
-            o_end = o_start + difference
-            if o_end > after:
-                yield self._create_occurrence(o_start, o_end)
+            yield self._create_occurrence(o_start, o_start + difference)
 
     def occurrences_after(self, after=None):
         """
@@ -225,7 +442,8 @@ class Event(with_metaclass(ModelBase, *get_model_bases())):
         ``after``.  Includes all of the persisted Occurrences.
         """
         from events.utils import OccurrenceReplacer
-        occ_replacer = OccurrenceReplacer(self.occurrence_set.all())
+        occ_replacer = OccurrenceReplacer(load_chunk=lambda start, end: self.occurrence_set.filter(
+            original_start__gte=start, original_start__lt=end))
         generator = self._occurrences_after_generator(after)
         while True:
             next_occurence = next(generator)
@@ -414,52 +632,32 @@ class EventRelation(with_metaclass(ModelBase, *get_model_bases())):
         verbose_name = _("event relation")
         verbose_name_plural = _("event relations")
         app_label = 'events'
+        index_together = (('content_type', 'object_id', 'distinction'), )
 
     def __str__(self):
         return u'%s(%s)-%s' % (self.event.title, self.distinction, self.content_object)
 
 
-@python_2_unicode_compatible
-class Occurrence(with_metaclass(ModelBase, *get_model_bases())):
-    event = models.ForeignKey(Event, verbose_name=_("event"))
-    title = models.CharField(_("title"), max_length=255, blank=True, null=True)
-    description = models.TextField(_("description"), blank=True, null=True)
-    start = models.DateTimeField(_("start"))
-    end = models.DateTimeField(_("end"))
-    all_day = models.BooleanField(default=False)
-    cancelled = models.BooleanField(_("cancelled"), default=False)
-    original_start = models.DateTimeField(_("original start"))
-    original_end = models.DateTimeField(_("original end"))
-
-    class Meta(object):
-        ordering = ('start', )
-        verbose_name = _("occurrence")
-        verbose_name_plural = _("occurrences")
-        app_label = 'events'
-
-    def __init__(self, *args, **kwargs):
-        super(Occurrence, self).__init__(*args, **kwargs)
-        if self.title is None and self.event_id:
-            self.title = self.event.title
-        if self.description is None and self.event_id:
-            self.description = self.event.description
-
-    def moved(self):
-        return self.original_start != self.start or self.original_end != self.end
-    moved = property(moved)
-
-    def move(self, new_start, new_end):
-        self.start = new_start
-        self.end = new_end
-        self.save()
+class OccurrenceManager(models.Manager):
+    def in_window(self, start, end):
+        """
+        Returns the persisted occurrences that matter for the period
+        ``[start, end)``: those replacing a generated occurrence that overlaps
+        it and those that were moved into it.
+        """
+        return self.get_queryset().filter(
+            Q(original_start__lt=end, original_end__gte=start) |
+            Q(start__lt=end, end__gte=start))
 
-    def cancel(self):
-        self.cancelled = True
-        self.save()
 
-    def uncancel(self):
-        self.cancelled = False
-        self.save()
+class OccurrenceMixin(object):
+    """
+    The read API shared by persisted occurrences and generated
+    ``OccurrenceView`` objects.
+    """
+    # Without empty slots here, OccurrenceView instances would still get a
+    # __dict__.
+    __slots__ = ()
 
     def get_absolute_url(self):
         if self.pk is not None:
@@ -526,12 +724,6 @@ class Occurrence(with_metaclass(ModelBase, *get_model_bases())):
     def gcal_url(self):
         return "http://www.google.com/calendar/render?cid=%s" % urlencode(self.ics_url())
 
-    def __str__(self):
-        return ugettext("%(start)s to %(end)s") % {
-            'start': self.start,
-            'end': self.end,
-        }
-
     def __cmp__(self, other):
         rank = cmp(self.start, other.start)
         if rank == 0:
@@ -539,8 +731,168 @@ class Occurrence(with_metaclass(ModelBase, *get_model_bases())):
         return rank
 
     def __lt__(self, other):
-        return self.end < other.end
+        return (self.start, self.end) < (other.start, other.end)
 
     def __eq__(self, other):
-        return (isinstance(other, Occurrence) and
+        return (isinstance(other, OccurrenceMixin) and
                 self.original_start == other.original_start and self.original_end == other.original_end)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash((self.original_start, self.original_end))
+
+
+@python_2_unicode_compatible
+class Occurrence(with_metaclass(ModelBase, *([OccurrenceMixin] + get_model_bases()))):
+    event = models.ForeignKey(Event, verbose_name=_("event"))
+    title = models.CharField(_("title"), max_length=255, blank=True, null=True)
+    description = models.TextField(_("description"), blank=True, null=True)
+    start = models.DateTimeField(_("start"))
+    end = models.DateTimeField(_("end"))
+    all_day = models.BooleanField(default=False)
+    cancelled = models.BooleanField(_("cancelled"), default=False)
+    original_start = models.DateTimeField(_("original start"))
+    original_end = models.DateTimeField(_("original end"))
+
+    objects = OccurrenceManager()
+
+    class Meta(object):
+        ordering = ('start', )
+        verbose_name = _("occurrence")
+        verbose_name_plural = _("occurrences")
+        app_label = 'events'
+        unique_together = (('event', 'original_start'), )
+
+    def __init__(self, *args, **kwargs):
+        super(Occurrence, self).__init__(*args, **kwargs)
+        if self.title is None and self.event_id:
+            self.title = self.event.title
+        if self.description is None and self.event_id:
+            self.description = self.event.description
+
+    def moved(self):
+        return self.original_start != self.start or self.original_end != self.end
+    moved = property(moved)
+
+    def move(self, new_start, new_end):
+        self.start = new_start
+        self.end = new_end
+        self.save()
+
+    def promote(self):
+        """
+        Persisted occurrences are already model instances.
+        """
+        return self
+
+    def cancel(self):
+        self.cancelled = True
+        self.save()
+
+    def uncancel(self):
+        self.cancelled = False
+        self.save()
+
+    def __str__(self):
+        return ugettext("%(start)s to %(end)s") % {
+            'start': self.start,
+            'end': self.end,
+        }
+
+
+@python_2_unicode_compatible
+class OccurrenceView(OccurrenceMixin):
+    """
+    A lightweight stand-in for an occurrence generated from the rule of an
+    event. It has the read API of ``Occurrence`` but none of the model
+    machinery, and is promoted to an ``Occurrence`` instance when it is saved,
+    moved or cancelled.
+    """
+    __slots__ = ('event', 'start', 'end', '_occurrence')
+
+    all_day = False
+
+    def __init__(self, event, start, end):
+        self.event = event
+        self.start = start
+        self.end = end
+        self._occurrence = None
+
+    def __getstate__(self):
+        return (self.event, self.start, self.end, self._occurrence)
+
+    def __setstate__(self, state):
+        self.event, self.start, self.end, self._occurrence = state
+
+    @property
+    def pk(self):
+        if self._occurrence is not None:
+            return self._occurrence.pk
+    id = pk
+
+    @property
+    def cancelled(self):
+        return self._occurrence is not None and self._occurrence.cancelled
+
+    @property
+    def moved(self):
+        return self._occurrence is not None and self._occurrence.moved
+
+    @property
+    def event_id(self):
+        return self.event.id
+
+    @property
+    def original_start(self):
+        return self.start
+
+    @property
+    def original_end(self):
+        return self.end
+
+    @property
+    def title(self):
+        return self.event.title
+
+    @property
+    def description(self):
+        return self.event.description
+
+    def promote(self):
+        """
+        Returns the (unsaved) ``Occurrence`` instance for this occurrence. The
+        same instance is returned on every call.
+        """
+        if self._occurrence is None:
+            self._occurrence = Occurrence(
+                event=self.event, start=self.start, end=self.end,
+                original_start=self.start, original_end=self.end)
+        return self._occurrence
+
+    def save(self):
+        occurrence = self.promote()
+        occurrence.save()
+        return occurrence
+
+    def move(self, new_start, new_end):
+        occurrence = self.promote()
+        occurrence.move(new_start, new_end)
+        return occurrence
+
+    def cancel(self):
+        occurrence = self.promote()
+        occurrence.cancel()
+        return occurrence
+
+    def uncancel(self):
+        occurrence = self.promote()
+        occurrence.uncancel()
+        return occurrence
+
+    def __str__(self):
+        return ugettext("%(start)s to %(end)s") % {
+            'start': self.start,
+            'end': self.end,
+        }
@@ -0,0 +1,140 @@
+from __future__ import unicode_literals
+from six.moves.builtins import object
+from six import with_metaclass
+import datetime
+
+from django.db import models
+from django.db.models import Q
+from django.db.models.base import ModelBase
+from django.utils import timezone
+from django.utils.translation import ugettext_lazy as _
+from django.utils.encoding import python_2_unicode_compatible
+
+from events.models.event import Event, Occurrence
+from events.recurrence import ExpansionBudget
+from events.settings import OCCURRENCE_INDEX_HISTORY_DAYS, OCCURRENCE_INDEX_HORIZON_DAYS
+from events.utils import get_model_bases
+
+
+class OccurrenceIndexManager(models.Manager):
+    def window(self, now=None):
+        """
+        Returns the ``(start, end)`` range that is materialized when an event
+        is indexed at ``now``.
+        """
+        if now is None:
+            now = timezone.now()
+        return (now - datetime.timedelta(days=OCCURRENCE_INDEX_HISTORY_DAYS),
+                now + datetime.timedelta(days=OCCURRENCE_INDEX_HORIZON_DAYS))
+
+    def covers(self, start, end):
+        """
+        Whether the range ``[start, end)`` can be answered from the index.
+
+        The horizon is rolled forward once a day by the
+        ``update_occurrence_index`` command, so the last day of the horizon is
+        not trusted.
+        """
+        window_start, window_end = self.window()
+        if timezone.is_naive(window_start) and timezone.is_aware(start):
+            start = timezone.make_naive(start, timezone.utc)
+            end = timezone.make_naive(end, timezone.utc)
+        return window_start <= start and end <= window_end - datetime.timedelta(days=1)
+
+    def index_event(self, event):
+        """
+        Replaces the rows of ``event`` with its occurrences in the current
+        window. The expansion budget does not apply, since periods are
+        answered from the index as if it were complete.
+        """
+        start, end = self.window()
+        self.filter(event=event).delete()
+        self.bulk_create([
+            self.model(
+                event=event,
+                occurrence=occ if occ.pk else None,
+                start=occ.start,
+                end=occ.end,
+                original_start=occ.original_start,
+                original_end=occ.original_end,
+                cancelled=occ.cancelled)
+            for occ in event.get_occurrences(start, end, False, ExpansionBudget(per_event=None, total=None))])
+
+    def index_occurrence(self, occurrence):
+        """
+        Replaces the generated row of a persisted occurrence, which may also
+        be given as the ``OccurrenceView`` it was saved from.
+        """
+        occurrence = occurrence.promote()
+        self.filter(event_id=occurrence.event_id,
+                    original_start=occurrence.original_start).delete()
+        self.create(
+            event_id=occurrence.event_id,
+            occurrence=occurrence,
+            start=occurrence.start,
+            end=occurrence.end,
+            original_start=occurrence.original_start,
+            original_end=occurrence.original_end,
+            cancelled=occurrence.cancelled)
+
+    def unindex_occurrence(self, occurrence):
+        """
+        Puts the row of a persisted occurrence about to be deleted back to its
+        generated times, or drops it if the event does not generate an
+        occurrence there in the current window. The generated row at its
+        original start is handled too, as it is only linked to the occurrence
+        when the index follows persisted occurrences.
+        """
+        rows = self.filter(
+            Q(occurrence=occurrence) |
+            Q(event_id=occurrence.event_id, original_start=occurrence.original_start))
+        event = occurrence.event
+        start, end = self.window()
+        replaces, _ = event._persisted_effect(occurrence, event.get_rule_seeker(), start, end, True)
+        if replaces:
+            rows.update(
+                occurrence=None,
+                start=occurrence.original_start,
+                end=occurrence.original_end,
+                cancelled=False)
+        else:
+            rows.delete()
+
+    def get_occurrences(self, events, start, end):
+        """
+        Returns the occurrences of ``events`` in ``[start, end)`` with a single
+        range scan of the index.
+        """
+        rows = self.filter(event__in=events, start__lt=end, end__gte=start)
+        rows = rows.select_related('event', 'event__calendar', 'occurrence').order_by('start', 'end', 'event')
+        return [row.occurrence or row.event._create_occurrence(row.start, row.end) for row in rows]
+
+
+@python_2_unicode_compatible
+class OccurrenceIndex(with_metaclass(ModelBase, *get_model_bases())):
+    """
+    A materialized copy of the occurrences of every event over a rolling
+    horizon. It is only maintained when ``OCCURRENCE_INDEX_ENABLED`` is set.
+    """
+    event = models.ForeignKey(Event, verbose_name=_("event"))
+    occurrence = models.ForeignKey(
+        Occurrence,
+        null=True, blank=True,
+        on_delete=models.SET_NULL,
+        verbose_name=_("occurrence"))
+    start = models.DateTimeField(_("start"))
+    end = models.DateTimeField(_("end"))
+    original_start = models.DateTimeField(_("original start"))
+    original_end = models.DateTimeField(_("original end"))
+    cancelled = models.BooleanField(_("cancelled"), default=False)
+
+    objects = OccurrenceIndexManager()
+
+    class Meta(object):
+        verbose_name = _("occurrence index")
+        verbose_name_plural = _("occurrence index")
+        app_label = 'events'
+        index_together = (('start', 'end'), ('event', 'original_start'))
+
+    def __str__(self):
+        return '%s: %s to %s' % (self.event_id, self.start, self.end)
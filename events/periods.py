@@ -1,16 +1,23 @@
 from __future__ import unicode_literals
 from six.moves.builtins import range
 from six.moves.builtins import object
+import copy
 import pytz
 import datetime
 import calendar as standardlib_calendar
+from bisect import bisect_left, bisect_right
 
 from django.conf import settings
+from django.db.models import Prefetch
 from django.utils.encoding import python_2_unicode_compatible
 from django.template.defaultfilters import date as date_filter
 from django.utils.dates import WEEKDAYS, WEEKDAYS_ABBR
-from events.settings import FIRST_DAY_OF_WEEK, SHOW_CANCELLED_OCCURRENCES
-from events.models import Occurrence
+from events.settings import FIRST_DAY_OF_WEEK, SHOW_CANCELLED_OCCURRENCES, OCCURRENCE_INDEX_ENABLED
+from events.models import Occurrence, OccurrenceIndex
+from events.utils import iter_occurrences
+from events.recurrence import ExpansionBudget
+from events.cache import period_cache
+from events.ranges import YearRange, MonthRange, WeekRange, DayRange, day_span, localize_to_utc
 from django.utils import timezone
 
 weekday_names = []
@@ -29,11 +36,232 @@ else:
         weekday_abbrs.append(WEEKDAYS_ABBR[i])
 
 
+class IntervalIndex(object):
+    """
+    The occurrences of a period sorted by start, along with the running
+    maximum of their ends, so the occurrences overlapping any range can be
+    found with bisect instead of scanning them all.
+
+    Sub-periods share the index of their parent through ``restrict``, which
+    only narrows the range the index answers for.
+    """
+    def __init__(self, occurrences):
+        self.occurrences = list(occurrences)
+        self._order = sorted(range(len(self.occurrences)), key=lambda i: self.occurrences[i].start)
+        self._starts = [self.occurrences[i].start for i in self._order]
+        self._max_ends = []
+        for i in self._order:
+            end = self.occurrences[i].end
+            if self._max_ends and self._max_ends[-1] > end:
+                end = self._max_ends[-1]
+            self._max_ends.append(end)
+        self.bounds = None
+        self.day_buckets = None
+        self.truncated = False
+
+    def restrict(self, start, end):
+        """
+        Returns a copy of the index, sharing its data, that only answers for
+        the occurrences overlapping ``[start, end)``.
+        """
+        index = copy.copy(self)
+        if self.bounds is not None:
+            start, end = max(start, self.bounds[0]), min(end, self.bounds[1])
+        index.bounds = (start, end)
+        return index
+
+    def overlapping(self, start, end, closed=False):
+        """
+        Returns the occurrences that start before ``end`` and end after
+        ``start`` (or at ``start`` if ``closed``), in their original order.
+        """
+        if self.bounds is not None:
+            start, end = max(start, self.bounds[0]), min(end, self.bounds[1])
+        last = bisect_left(self._starts, end)
+        if closed:
+            # every occurrence before ``first`` ends before ``start``
+            first = bisect_left(self._max_ends, start)
+            positions = [i for i in self._order[first:last] if self.occurrences[i].end >= start]
+        else:
+            # every occurrence before ``first`` ends at or before ``start``
+            first = bisect_right(self._max_ends, start)
+            positions = [i for i in self._order[first:last] if self.occurrences[i].end > start]
+        return [self.occurrences[i] for i in sorted(positions)]
+
+
+class ExpansionContext(object):
+    """
+    Expands a set of events once over a window and hands out the occurrences
+    of every period within it, so the periods of a view (e.g. the three
+    months of the tri-month calendar) share a single expansion.
+    """
+    def __init__(self, events, start, end):
+        self.events = events
+        self.utc_start = start
+        self.utc_end = end
+        self._index = None
+
+    @classmethod
+    def share(cls, periods, adjacent=0):
+        """
+        Attaches a context to ``periods`` covering them and ``adjacent``
+        periods before and after each of them. Their ``next`` and ``prev``
+        periods keep using it while they stay within it.
+        """
+        periods = list(periods)
+        if not periods:
+            return None
+        bounds = []
+        for period in periods:
+            before = after = period
+            for i in range(adjacent):
+                before, after = before.prev(), next(after)
+            bounds += [before.utc_start, after.utc_end]
+        context = cls(periods[0].events, min(bounds), max(bounds))
+        for period in periods:
+            period.context = context
+        return context
+
+    def covers(self, start, end):
+        return self.utc_start <= start and end <= self.utc_end
+
+    @property
+    def truncated(self):
+        return self._index is not None and self._index.truncated
+
+    @property
+    def expanded(self):
+        """
+        Whether the events have been expanded over the window already.
+        """
+        return self._index is not None
+
+    def get_occurrences(self, start, end):
+        """
+        Returns the occurrences of the period ``[start, end)``, as the period
+        would compute them itself.
+        """
+        if self._index is None:
+            window = Period(self.events, self.utc_start, self.utc_end, tzinfo=None)
+            self._index = IntervalIndex(window.occurrences)
+            self._index.truncated = window.truncated
+        return self._index.overlapping(start, end, closed=True)
+
+
+def classify_between(occurrence, start, end):
+    """
+    Classifies ``occurrence`` against the period ``[start, end)`` as
+    described in ``Period.classify_occurrence``.
+    """
+    if occurrence.cancelled and not SHOW_CANCELLED_OCCURRENCES:
+        return
+    if occurrence.start > end or occurrence.end < start:
+        return
+
+    all_day = False
+    started = False
+    ended = False
+    rtn_dict = {
+        'occurrence': occurrence,
+        'class': 2,
+        'all_day': all_day,
+    }
+
+    if occurrence.event.all_day is True:
+        all_day = True
+        rtn_dict['all_day'] = True
+
+    if start <= occurrence.start < end:
+        started = True
+    if start <= occurrence.end < end:
+        ended = True
+    if started and ended:
+        rtn_dict['class'] = 1
+    elif started:
+        rtn_dict['class'] = 0
+    elif ended:
+        rtn_dict['class'] = 3
+    # it existed during this period but it didn't begin or end within it
+    # so it must have just continued
+    return rtn_dict
+
+
+def day_range(date, tzinfo):
+    """
+    Returns the UTC start and end of ``date`` in ``tzinfo``.
+    """
+    day = DayRange(date, tzinfo)
+    return day.utc_start, day.utc_end
+
+
+class DayBuckets(object):
+    """
+    The partials of a list of occurrences for every day from ``first`` to
+    ``last``, as ``Day.get_occurrence_partials`` would return them, computed
+    in a single sweep the first time a day is looked up.
+    """
+    def __init__(self, occurrences, tzinfo, first, last):
+        self.occurrences = occurrences
+        self.tzinfo = tzinfo
+        self.first = first
+        self.last = last
+        self._buckets = None
+
+    def _local_date(self, dt):
+        if self.tzinfo is not None and dt.tzinfo is not None:
+            return dt.astimezone(self.tzinfo).date()
+        return dt.date()
+
+    def _sweep(self):
+        buckets = {}
+        ranges = {}
+        one_day = datetime.timedelta(days=1)
+        for occurrence in self.occurrences:
+            if occurrence.cancelled and not SHOW_CANCELLED_OCCURRENCES:
+                continue
+            date = max(self.first, self._local_date(occurrence.start) - one_day)
+            last = min(self.last, self._local_date(occurrence.end) + one_day)
+            while date <= last:
+                if date not in ranges:
+                    ranges[date] = day_range(date, self.tzinfo)
+                start, end = ranges[date]
+                if occurrence.start < end and occurrence.end > start:
+                    buckets.setdefault(date, []).append(classify_between(occurrence, start, end))
+                date += one_day
+        return buckets
+
+    def get(self, date):
+        """
+        Returns the partials of ``date``, or ``None`` if it is out of range.
+        """
+        if not self.first <= date <= self.last:
+            return None
+        if self._buckets is None:
+            self._buckets = self._sweep()
+        return self._buckets.get(date, [])
+
+
 class Period(object):
     '''
     This class represents a period of time. It can return a set of occurrences
     based on its events, and its time period (start and end).
     '''
+    # Whether the day periods cut from this period read their partials from
+    # buckets filled in one sweep over the occurrences.
+    bucket_days = False
+    # The ExpansionContext this period takes its occurrences from when it
+    # falls within it.
+    context = None
+    # The PeriodCache occurrences are kept in between requests, if any.
+    cache = period_cache
+    # The ExpansionBudget of the occurrences this period expanded itself.
+    _budget = None
+    # The period the busy days of this one are cut from, if any.
+    busy_parent = None
+    _busy_days = None
+    # Whether the cache has been looked up for the occurrences of this period.
+    _cache_checked = False
+
     def __init__(self, events, start, end, parent_persisted_occurrences=None,
                  occurrence_pool=None, tzinfo=pytz.utc):
         self.utc_start = self._normalize_timezone_to_utc(start, tzinfo) or datetime.datetime.now(tzinfo)
@@ -46,10 +274,12 @@ class Period(object):
             self._persisted_occurrences = parent_persisted_occurrences
 
     def _normalize_timezone_to_utc(self, point_in_time, tzinfo):
+        if point_in_time.tzinfo is pytz.utc:
+            return point_in_time
         if point_in_time.tzinfo is not None:
             return point_in_time.astimezone(pytz.utc)
         if tzinfo is not None:
-            return tzinfo.localize(point_in_time).astimezone(pytz.utc)
+            return localize_to_utc(point_in_time, tzinfo)
         if settings.USE_TZ:
             return pytz.utc.localize(point_in_time)
         else:
@@ -68,22 +298,49 @@ class Period(object):
         return tzinfo if settings.USE_TZ else None
 
     def _get_sorted_occurrences(self):
-        occurrences = []
         if hasattr(self, "occurrence_pool") and self.occurrence_pool is not None:
-            for occurrence in self.occurrence_pool:
-                if occurrence.start < self.utc_end and occurrence.end > self.utc_start:
-                    occurrences.append(occurrence)
-            return occurrences
+            if not isinstance(self.occurrence_pool, IntervalIndex):
+                self.occurrence_pool = IntervalIndex(self.occurrence_pool)
+            self.occurrence_pool = self.occurrence_pool.restrict(self.utc_start, self.utc_end)
+            return self.occurrence_pool.overlapping(self.utc_start, self.utc_end)
+
+        if self.context is not None and self.context.covers(self.utc_start, self.utc_end):
+            return self.context.get_occurrences(self.utc_start, self.utc_end)
+
+        if self.cache is not None and hasattr(self.events, 'query'):
+            return self.cache.get_occurrences(self, self._expand_occurrences)
+        return self._expand_occurrences()
+
+    def _expand_occurrences(self):
+        return list(self._iter_expanded_occurrences())
 
+    def _iter_expanded_occurrences(self):
+        self._budget = ExpansionBudget()
+        if self._index_covers():
+            return iter(OccurrenceIndex.objects.get_occurrences(self.events, self.utc_start, self.utc_end))
+        return iter_occurrences(self._get_events(), self.utc_start, self.utc_end, self._budget)
+
+    def _index_covers(self):
+        return (OCCURRENCE_INDEX_ENABLED and hasattr(self.events, 'filter') and
+                OccurrenceIndex.objects.covers(self.utc_start, self.utc_end))
+
+    def _get_events(self):
+        """
+        Returns the events that may have occurrences in this period, along
+        with their rules and the persisted occurrences that matter for it.
+        """
         if hasattr(self.events, 'prefetch_related'):
-            self.events = self.events.select_related('calendar').prefetch_related('rule', 'occurrence_set')
+            persisted_occurrences = Prefetch(
+                'occurrence_set',
+                queryset=Occurrence.objects.in_window(self.utc_start, self.utc_end))
+            self.events = self.events.select_related('calendar').prefetch_related('rule', persisted_occurrences)
         else:
             self.events = self.events.select_related('calendar')
 
-        for event in self.events.all():
-            event_occurrences = event.get_occurrences(self.utc_start, self.utc_end, False)
-            occurrences += event_occurrences
-        return sorted(occurrences)
+        events = self.events.all()
+        if hasattr(events, 'possibly_overlapping'):
+            events = events.possibly_overlapping(self.utc_start, self.utc_end)
+        return events
 
     def cached_get_sorted_occurrences(self):
         if hasattr(self, '_occurrences'):
@@ -93,15 +350,188 @@ class Period(object):
         return occs
     occurrences = property(cached_get_sorted_occurrences)
 
+    @property
+    def truncated(self):
+        """
+        Whether the expansion budget cut the occurrences of this period, or
+        of the period or context it reads them from, short.
+        """
+        if self._budget is not None:
+            return self._budget.truncated
+        if isinstance(self.occurrence_pool, IntervalIndex):
+            return self.occurrence_pool.truncated
+        if self.context is not None and self.context.covers(self.utc_start, self.utc_end):
+            return self.context.truncated
+        return False
+
+    def iter_occurrences(self):
+        """
+        Iterates over the occurrences of this period in order. Unless they
+        have been computed already or can be sliced from a pool, a context or
+        the cache, they are merged from the events as they are consumed and
+        not kept, so that stopping early saves creating the rest of them.
+        """
+        if self._occurrences_at_hand():
+            return iter(self.occurrences)
+        return self._iter_expanded_occurrences()
+
+    def _occurrences_at_hand(self):
+        """
+        Whether the occurrences of this period have been computed already or
+        can be sliced from a pool or from a context that has expanded its
+        events. The cache is looked up once, and a hit keeps its occurrences.
+        """
+        if hasattr(self, '_occurrences') or self.occurrence_pool is not None:
+            return True
+        if (self.context is not None and self.context.expanded and
+                self.context.covers(self.utc_start, self.utc_end)):
+            return True
+        if self.cache is not None and not self._cache_checked and hasattr(self.events, 'query'):
+            self._cache_checked = True
+            occurrences = self.cache.peek(self)
+            if occurrences is not None:
+                self._occurrences = occurrences
+                return True
+        return False
+
+    def count_occurrences(self):
+        """
+        Returns how many occurrences ``get_occurrence_partials`` would return.
+        Unless the occurrences are at hand, they are counted with
+        ``Event.count_between`` without creating them.
+        """
+        if self._occurrences_at_hand() or self._index_covers():
+            return sum(1 for o in self.iter_occurrences() if self.classify_occurrence(o))
+        return sum(self._iter_event_counts())
+
+    def _iter_event_counts(self):
+        for event in self._get_events():
+            yield event.count_between(self.utc_start, self.utc_end, SHOW_CANCELLED_OCCURRENCES,
+                                      event.occurrence_set.all())
+
+    def get_day_boundaries(self):
+        """
+        Returns the UTC start of every local day of this period, the first one
+        starting with the period, followed by the end of the period.
+        """
+        boundaries = [self.utc_start]
+        date = self.start.date()
+        while True:
+            date += datetime.timedelta(days=1)
+            midnight = self._normalize_timezone_to_utc(
+                datetime.datetime.combine(date, datetime.time.min), self.tzinfo)
+            if midnight >= self.utc_end:
+                break
+            boundaries.append(midnight)
+        boundaries.append(self.utc_end)
+        return boundaries
+
+    def busy_days(self):
+        """
+        Returns the local days of this period during which an occurrence takes
+        place, as a bitset: bit ``n % 8`` of byte ``n // 8`` is set if the
+        ``n``-th day is busy. The occurrences are not created, and a whole
+        year fits in 46 bytes kept in the period cache under a single key.
+        """
+        if self._busy_days is None:
+            if self.busy_parent is not None:
+                self._busy_days = self._cut_busy_days(self.busy_parent)
+            elif self.cache is not None and hasattr(self.events, 'query'):
+                self._busy_days = self.cache.get_busy_days(self, self._compute_busy_days)
+            else:
+                self._busy_days = self._compute_busy_days()
+        return self._busy_days
+
+    def is_busy_day(self, date):
+        """
+        Whether an occurrence takes place during the local day ``date``.
+        """
+        n = (date - self.start.date()).days
+        bits = self.busy_days()
+        return 0 <= n < len(bits) * 8 and bool(bits[n >> 3] & (1 << (n & 7)))
+
+    def _compute_busy_days(self):
+        days = self.get_day_boundaries()
+        bits = bytearray((len(days) + 6) // 8)
+        if self._occurrences_at_hand() or self._index_covers():
+            spans = (day_span(days, o.start, o.end) for o in self.iter_occurrences()
+                     if not o.cancelled or SHOW_CANCELLED_OCCURRENCES)
+        else:
+            spans = (span for event in self._get_events()
+                     for span in event.iter_busy_days(days, SHOW_CANCELLED_OCCURRENCES,
+                                                      event.occurrence_set.all()))
+        for first, last in spans:
+            for n in range(first, last + 1):
+                bits[n >> 3] |= 1 << (n & 7)
+        return bits
+
+    def _cut_busy_days(self, parent):
+        first = self.start.date()
+        count = len(self.get_day_boundaries()) - 1
+        bits = bytearray((count + 7) // 8)
+        for n in range(count):
+            if parent.is_busy_day(first + datetime.timedelta(days=n)):
+                bits[n >> 3] |= 1 << (n & 7)
+        return bits
+
+    def get_busy_periods(self, cls):
+        """
+        Yields the ``cls`` periods of this period, like ``get_periods``, for
+        views that only show their busy days: nothing is expanded until their
+        ``busy_days``, cut from those of this period, are asked for.
+        """
+        period = cls(self.events, self.start.replace(tzinfo=None), tzinfo=self.tzinfo)
+        while period.utc_start < self.utc_end:
+            period.busy_parent = self
+            yield period
+            period = next(period)
+
+    def _from_range(self, period_range):
+        """
+        Returns the period of the same class as this one, with the same
+        events and expansion context, covering ``period_range``.
+        """
+        return self._share_context(self.__class__(self.events, period_range.naive_start, tzinfo=self.tzinfo))
+
+    def _share_context(self, period):
+        """
+        Lets an adjacent ``period`` read from the expansion context of this
+        one.
+        """
+        period.context = self.context
+        return period
+
+    def get_interval_index(self):
+        """
+        Returns the ``IntervalIndex`` of the occurrences of this period, which
+        is the one of the parent period when this period was cut from it.
+        """
+        if hasattr(self, '_interval_index'):
+            return self._interval_index
+        occurrences = self.occurrences
+        if isinstance(self.occurrence_pool, IntervalIndex):
+            self._interval_index = self.occurrence_pool
+        else:
+            self._interval_index = IntervalIndex(occurrences)
+            self._interval_index.truncated = self.truncated
+        if self.bucket_days and getattr(self._interval_index, 'day_buckets', None) is None:
+            # the day grid of a month may reach into the neighbouring weeks
+            margin = datetime.timedelta(days=7)
+            self._interval_index.day_buckets = DayBuckets(
+                self._interval_index.occurrences, self.tzinfo,
+                (self.start - margin).date(), (self.end + margin).date())
+        return self._interval_index
+
     def get_all_day_occurrences(self):
         occ_list = [o for o in self.occurrences if o.event.all_day is True and o.end < self.utc_end]
         return occ_list
 
     def get_persisted_occurrences(self):
-        if hasattr(self, '_persisted_occurrenes'):
+        if hasattr(self, '_persisted_occurrences'):
             return self._persisted_occurrences
         else:
-            self._persisted_occurrences = Occurrence.objects.filter(event__in=self.events)
+            self._persisted_occurrences = Occurrence.objects.in_window(
+                self.utc_start, self.utc_end).filter(event__in=self.events)
             return self._persisted_occurrences
 
     def classify_occurrence(self, occurrence):
@@ -121,37 +551,7 @@ class Period(object):
             | 3 - Only ended during this period.
         """
 
-        if occurrence.cancelled and not SHOW_CANCELLED_OCCURRENCES:
-            return
-        if occurrence.start > self.utc_end or occurrence.end < self.utc_start:
-            return
-
-        all_day = False
-        started = False
-        ended = False
-        rtn_dict = {
-            'occurrence': occurrence,
-            'class': 2,
-            'all_day': all_day,
-        }
-
-        if occurrence.event.all_day is True:
-            all_day = True
-            rtn_dict['all_day'] = True
-
-        if self.utc_start <= occurrence.start < self.utc_end:
-            started = True
-        if self.utc_start <= occurrence.end < self.utc_end:
-            ended = True
-        if started and ended:
-            rtn_dict['class'] = 1
-        elif started:
-            rtn_dict['class'] = 0
-        elif ended:
-            rtn_dict['class'] = 3
-        # it existed during this period but it didn't begin or end within it
-        # so it must have just continued
-        return rtn_dict
+        return classify_between(occurrence, self.utc_start, self.utc_end)
 
     def get_occurrence_partials(self):
         occurrence_dicts = []
@@ -165,20 +565,22 @@ class Period(object):
         return self.occurrences
 
     def has_occurrences(self):
-        return any(self.classify_occurrence(o) for o in self.occurrences)
+        if self._occurrences_at_hand() or self._index_covers():
+            return any(self.classify_occurrence(o) for o in self.iter_occurrences())
+        return any(self._iter_event_counts())
 
     def get_time_slot(self, start, end, occurrence_pool=None):
         if start >= self.utc_start and end <= self.utc_end:
             return Period(self.events, start, end,
                 parent_persisted_occurrences=self.get_persisted_occurrences(),
-                occurrence_pool=self.occurrences)
+                occurrence_pool=self.get_interval_index())
         return None
 
     def create_sub_period(self, cls, start=None, occurrence_pool=None, tzinfo=None):
         if tzinfo is None:
             tzinfo = self.tzinfo
         start = start or self.utc_start
-        occurrences = occurrence_pool or self.occurrences
+        occurrences = occurrence_pool or self.get_interval_index()
         return cls(self.events, start, self.get_persisted_occurrences(), occurrences, tzinfo)
 
     def get_periods(self, cls, occurrence_pool=None, tzinfo=None):
@@ -191,54 +593,60 @@ class Period(object):
 
     @property
     def start(self):
-        if self.tzinfo is not None:
-            return self.utc_start.astimezone(self.tzinfo)
-        return self.utc_start.replace(tzinfo=None)
+        return self._to_local('_start', self.utc_start)
 
     @property
     def end(self):
+        return self._to_local('_end', self.utc_end)
+
+    def _to_local(self, name, utc):
+        """
+        Returns ``utc`` in the time zone of this period, converting it only
+        once as long as neither changes.
+        """
+        cached = self.__dict__.get(name)
+        if cached is not None and cached[0] is utc and cached[1] is self.tzinfo:
+            return cached[2]
         if self.tzinfo is not None:
-            return self.utc_end.astimezone(self.tzinfo)
-        return self.utc_end.replace(tzinfo=None)
+            local = utc.astimezone(self.tzinfo)
+        else:
+            local = utc.replace(tzinfo=None)
+        self.__dict__[name] = (utc, self.tzinfo, local)
+        return local
 
 
 @python_2_unicode_compatible
 class Year(Period):
+    bucket_days = True
+
     def __init__(self, events, date=None, parent_persisted_occurrences=None, tzinfo=pytz.utc):
+        self.tzinfo = self._get_tzinfo(tzinfo)
         if date is None:
             date = timezone.now()
-        start, end = self._get_year_range(date)
-        super(Year, self).__init__(events, start, end, parent_persisted_occurrences, tzinfo=tzinfo)
+        self.range = YearRange(date, self.tzinfo)
+        super(Year, self).__init__(events, self.range.utc_start, self.range.utc_end,
+                                   parent_persisted_occurrences, tzinfo=tzinfo)
 
     def get_months(self):
         return self.get_periods(Month)
 
+    def get_busy_months(self):
+        return self.get_busy_periods(Month)
+
     def next_year(self):
-        return Year(self.events, self.utc_end)
+        return self._from_range(self.range.next())
     next = __next__ = next_year
 
     def prev_year(self):
-        start = datetime.datetime(self.start.year - 1, self.start.month, self.start.day)
-        return Year(self.events, start, tzinfo=self.tzinfo)
+        return self._from_range(self.range.prev())
     prev = prev_year
 
     def _get_year_range(self, year):
-        # If tzinfo is not none get the local start of the year and convert it to utc.
-        naive_start = datetime.datetime(year.year, datetime.datetime.min.month, datetime.datetime.min.day)
-        naive_end = datetime.datetime(year.year + 1, datetime.datetime.min.month, datetime.datetime.min.day)
-
-        start = naive_start
-        end = naive_end
-        if self.tzinfo is not None:
-            local_start = self.tzinfo.localize(naive_start)
-            local_end = self.tzinfo.localize(naive_end)
-            start = local_start.astimezone(pytz.utc)
-            end = local_end.astimezone(pytz.utc)
-
-        return start, end
+        year = YearRange(year, self.tzinfo)
+        return year.utc_start, year.utc_end
 
     def __str__(self):
-        return self.start.year
+        return '%s' % self.range
 
 
 @python_2_unicode_compatible
@@ -247,13 +655,15 @@ class Month(Period):
     The month period has functions for retrieving the week periods within this period
     and day periods within the date.
     """
+    bucket_days = True
+
     def __init__(self, events, date=None, parent_persisted_occurrences=None,
                  occurrence_pool=None, tzinfo=pytz.utc):
         self.tzinfo = self._get_tzinfo(tzinfo)
         if date is None:
             date = timezone.now()
-        start, end = self._get_month_range(date)
-        super(Month, self).__init__(events, start, end,
+        self.range = MonthRange(date, self.tzinfo)
+        super(Month, self).__init__(events, self.range.utc_start, self.range.utc_end,
                                     parent_persisted_occurrences, occurrence_pool, tzinfo=tzinfo)
 
     def get_weeks(self):
@@ -269,47 +679,30 @@ class Month(Period):
         return self.create_sub_period(Day, date)
 
     def next_month(self):
-        return Month(self.events, self.end, tzinfo=self.tzinfo)
+        return self._from_range(self.range.next())
     next = __next__ = next_month
 
     def prev_month(self):
-        start = (self.start - datetime.timedelta(days=1)).replace(day=1, tzinfo=self.tzinfo)
-        return Month(self.events, start, tzinfo=self.tzinfo)
+        return self._from_range(self.range.prev())
     prev = prev_month
 
     def current_year(self):
-        return Year(self.events, self.start, tzinfo=self.tzinfo)
+        return self._share_context(Year(self.events, self.start, tzinfo=self.tzinfo))
 
     def prev_year(self):
         start = datetime.datetime.min.replace(year=self.start.year - 1, tzinfo=self.tzinfo)
-        return Year(self.events, start, tzinfo=self.tzinfo)
+        return self._share_context(Year(self.events, start, tzinfo=self.tzinfo))
 
     def next_year(self):
         start = datetime.datetime.min.replace(year=self.start.year + 1, tzinfo=self.tzinfo)
-        return Year(self.events, start, tzinfo=self.tzinfo)
+        return self._share_context(Year(self.events, start, tzinfo=self.tzinfo))
 
     def _get_month_range(self, month):
-        year = month.year
-        month = month.month
-        # If tzinfo is not none get the local start of the month and convert it to utc.
-        naive_start = datetime.datetime.min.replace(year=year, month=month)
-        if month == 12:
-            naive_end = datetime.datetime.min.replace(month=1, year=year + 1, day=1)
-        else:
-            naive_end = datetime.datetime.min.replace(month=month + 1, year=year, day=1)
-
-        start = naive_start
-        end = naive_end
-        if self.tzinfo is not None:
-            local_start = self.tzinfo.localize(naive_start)
-            local_end = self.tzinfo.localize(naive_end)
-            start = local_start.astimezone(pytz.utc)
-            end = local_end.astimezone(pytz.utc)
-
-        return start, end
+        month = MonthRange(month, self.tzinfo)
+        return month.utc_start, month.utc_end
 
     def __str__(self):
-        return "%s %s" % (self.name(), self.year())
+        return '%s' % self.range
 
     def name(self):
         return standardlib_calendar.month_name[self.start.month]
@@ -329,56 +722,30 @@ class Week(Period):
         self.tzinfo = self._get_tzinfo(tzinfo)
         if date is None:
             date = timezone.now()
-        start, end = self._get_week_range(date)
-        super(Week, self).__init__(events, start, end,
+        self.range = WeekRange(date, self.tzinfo)
+        super(Week, self).__init__(events, self.range.utc_start, self.range.utc_end,
                                    parent_persisted_occurrences, occurrence_pool, tzinfo=tzinfo)
 
     def prev_week(self):
-        return Week(self.events, self.start - datetime.timedelta(days=7), tzinfo=self.tzinfo)
+        return self._from_range(self.range.prev())
     prev = prev_week
 
     def next_week(self):
-        return Week(self.events, self.end, tzinfo=self.tzinfo)
+        return self._from_range(self.range.next())
     next = __next__ = next_week
 
     def current_month(self):
-        return Month(self.events, self.start, tzinfo=self.tzinfo)
+        return self._share_context(Month(self.events, self.start, tzinfo=self.tzinfo))
 
     def current_year(self):
-        return Year(self.events, self.start, tzinfo=self.tzinfo)
+        return self._share_context(Year(self.events, self.start, tzinfo=self.tzinfo))
 
     def get_days(self):
         return self.get_periods(Day)
 
     def _get_week_range(self, week):
-        if isinstance(week, datetime.datetime):
-            week = week.date()
-        # Adjust the start datetime to midnight of the week datetime
-        naive_start = datetime.datetime.combine(week, datetime.time.min)
-        # Adjust the start datetime to Monday or Sunday of the current week
-        sub_days = 0
-        if FIRST_DAY_OF_WEEK == 1:
-            # The week begins on Monday
-            sub_days = naive_start.isoweekday() - 1
-        else:
-            # The week begins on Sunday
-            sub_days = naive_start.isoweekday()
-            if sub_days == 7:
-                sub_days = 0
-        if sub_days > 0:
-            naive_start = naive_start - datetime.timedelta(days=sub_days)
-        naive_end = naive_start + datetime.timedelta(days=7)
-
-        if self.tzinfo is not None:
-            local_start = self.tzinfo.localize(naive_start)
-            local_end = self.tzinfo.localize(naive_end)
-            start = local_start.astimezone(pytz.utc)
-            end = local_end.astimezone(pytz.utc)
-        else:
-            start = naive_start
-            end = naive_end
-
-        return start, end
+        week = WeekRange(week, self.tzinfo)
+        return week.utc_start, week.utc_end
 
     def __str__(self):
         date_format = 'l, %s' % settings.DATE_FORMAT
@@ -395,26 +762,42 @@ class Day(Period):
         self.tzinfo = self._get_tzinfo(tzinfo)
         if date is None:
             date = timezone.now()
-        start, end = self._get_day_range(date)
-        super(Day, self).__init__(events, start, end,
+        self.range = DayRange(date, self.tzinfo)
+        self.date = self.range.date
+        super(Day, self).__init__(events, self.range.utc_start, self.range.utc_end,
                                   parent_persisted_occurrences, occurrence_pool, tzinfo=tzinfo)
 
     def _get_day_range(self, date):
-        if isinstance(date, datetime.datetime):
-            date = date.date()
+        day = DayRange(date, self.tzinfo)
+        return day.utc_start, day.utc_end
 
-        naive_start = datetime.datetime.combine(date, datetime.time.min)
-        naive_end = datetime.datetime.combine(date + datetime.timedelta(days=1), datetime.time.min)
-        if self.tzinfo is not None:
-            local_start = self.tzinfo.localize(naive_start)
-            local_end = self.tzinfo.localize(naive_end)
-            start = local_start.astimezone(pytz.utc)
-            end = local_end.astimezone(pytz.utc)
-        else:
-            start = naive_start
-            end = naive_end
+    def _get_bucketed_partials(self):
+        """
+        Returns the partials of this day from the buckets of the month or
+        year it was cut from, or ``None`` if there are none.
+        """
+        if not hasattr(self, '_partials'):
+            self._partials = None
+            buckets = getattr(self.occurrence_pool, 'day_buckets', None)
+            if buckets is not None and buckets.tzinfo == self.tzinfo:
+                partials = buckets.get(self.date)
+                if partials is not None:
+                    start, end = self.occurrence_pool.restrict(self.utc_start, self.utc_end).bounds
+                    self._partials = [p for p in partials
+                                      if p['occurrence'].start < end and p['occurrence'].end > start]
+        return self._partials
 
-        return start, end
+    def get_occurrence_partials(self):
+        partials = self._get_bucketed_partials()
+        if partials is None:
+            return super(Day, self).get_occurrence_partials()
+        return partials
+
+    def has_occurrences(self):
+        partials = self._get_bucketed_partials()
+        if partials is None:
+            return super(Day, self).has_occurrences()
+        return bool(partials)
 
     def is_today(self):
         if self.utc_start.date() == datetime.date.today():
@@ -432,18 +815,18 @@ class Day(Period):
         return self.utc_start < start
 
     def prev_day(self):
-        return Day(self.events, self.start - datetime.timedelta(days=1), tzinfo=self.tzinfo)
+        return self._from_range(self.range.prev())
     prev = prev_day
 
     def next_day(self):
-        return Day(self.events, self.end, tzinfo=self.tzinfo)
+        return self._from_range(self.range.next())
     next = __next__ = next_day
 
     def current_year(self):
-        return Year(self.events, self.start, tzinfo=self.tzinfo)
+        return self._share_context(Year(self.events, self.start, tzinfo=self.tzinfo))
 
     def current_month(self):
-        return Month(self.events, self.start, tzinfo=self.tzinfo)
+        return self._share_context(Month(self.events, self.start, tzinfo=self.tzinfo))
 
     def current_week(self):
-        return Week(self.events, self.start, tzinfo=self.tzinfo)
+        return self._share_context(Week(self.events, self.start, tzinfo=self.tzinfo))
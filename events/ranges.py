@@ -0,0 +1,208 @@
+"""
+Boundaries of calendar periods.
+
+A ``PeriodRange`` knows where a year, month, week or day starts and ends in
+a time zone and which ranges come before and after it, without any events
+attached. The ``Period`` classes build on them, and the navigation template
+tags use them directly.
+"""
+from __future__ import unicode_literals
+import calendar as standardlib_calendar
+import datetime
+from bisect import bisect_left, bisect_right
+
+import pytz
+from django.utils.encoding import python_2_unicode_compatible
+
+from events.recurrence import LRUCache
+from events.settings import FIRST_DAY_OF_WEEK
+
+# The number of (time zone, year) pairs whose local midnights are kept
+MIDNIGHT_CACHE_SIZE = 64
+
+_midnights = LRUCache(MIDNIGHT_CACHE_SIZE)
+
+
+def is_utc(tzinfo):
+    return tzinfo is pytz.utc or getattr(tzinfo, 'zone', None) == 'UTC'
+
+
+def _year_midnights(tzinfo, year):
+    """
+    Returns the UTC time of the local midnight of every day of ``year`` in
+    ``tzinfo``. The offset is only looked up again on the days next to a DST
+    transition of the time zone.
+    """
+    transitions = getattr(tzinfo, '_utc_transition_times', None)
+    one_day = datetime.timedelta(days=1)
+    day = datetime.datetime(year, 1, 1)
+    offset = None
+    midnights = []
+    while day.year == year:
+        if offset is None or (transitions and _near_transition(transitions, day - offset)):
+            offset = tzinfo.localize(day).utcoffset()
+        midnights.append((day - offset).replace(tzinfo=pytz.utc))
+        day += one_day
+    return midnights
+
+
+def _near_transition(transitions, utc):
+    """
+    Whether one of the naive UTC ``transitions`` is within a day of ``utc``.
+    """
+    one_day = datetime.timedelta(days=1)
+    position = bisect_left(transitions, utc - one_day)
+    return position < len(transitions) and transitions[position] <= utc + one_day
+
+
+def localize_to_utc(naive, tzinfo):
+    """
+    Returns the UTC time of the local wall clock time ``naive`` in the pytz
+    time zone ``tzinfo``, as ``tzinfo.localize(naive).astimezone(pytz.utc)``
+    would.
+
+    Local midnights, which bound every period, are looked up in a table
+    computed once for each time zone and year.
+    """
+    if is_utc(tzinfo):
+        return naive.replace(tzinfo=pytz.utc)
+    if naive.time() != datetime.time.min or not hasattr(tzinfo, 'localize'):
+        return tzinfo.localize(naive).astimezone(pytz.utc)
+    key = (getattr(tzinfo, 'zone', None) or tzinfo, naive.year)
+    midnights = _midnights.get(key)
+    if midnights is None:
+        midnights = _year_midnights(tzinfo, naive.year)
+        _midnights.set(key, midnights)
+    return midnights[naive.timetuple().tm_yday - 1]
+
+
+def day_span(days, start, end):
+    """
+    Returns the indexes ``(first, last)`` of the days an occurrence from
+    ``start`` to ``end`` takes place during, ``days`` being the UTC boundaries
+    of consecutive days as returned by ``Period.get_day_boundaries``. ``first``
+    is greater than ``last`` if there are none.
+    """
+    first = max(bisect_right(days, start) - 1, 0)
+    last = min(bisect_left(days, end) - 1, len(days) - 2)
+    return first, last
+
+
+class PeriodRange(object):
+    """
+    The ``[start, end)`` range of the period containing ``date`` in
+    ``tzinfo``, or of naive datetimes if ``tzinfo`` is ``None``.
+
+    ``utc_start`` and ``utc_end`` are in UTC, ``start`` and ``end`` in
+    ``tzinfo`` and ``naive_start`` and ``naive_end`` are the local wall clock
+    times.
+    """
+    _start = _end = None
+
+    def __init__(self, date, tzinfo=None):
+        self.tzinfo = tzinfo
+        self.naive_start, self.naive_end = self.get_naive_range(date)
+        if tzinfo is not None:
+            self.utc_start = localize_to_utc(self.naive_start, tzinfo)
+            self.utc_end = localize_to_utc(self.naive_end, tzinfo)
+        else:
+            self.utc_start = self.naive_start
+            self.utc_end = self.naive_end
+
+    def get_naive_range(self, date):
+        raise NotImplementedError
+
+    @property
+    def start(self):
+        if self.tzinfo is None:
+            return self.naive_start
+        if self._start is None:
+            self._start = self.utc_start.astimezone(self.tzinfo)
+        return self._start
+
+    @property
+    def end(self):
+        if self.tzinfo is None:
+            return self.naive_end
+        if self._end is None:
+            self._end = self.utc_end.astimezone(self.tzinfo)
+        return self._end
+
+    def next(self):
+        return self.__class__(self.naive_end, self.tzinfo)
+    __next__ = next
+
+    def prev(self):
+        return self.__class__(self.naive_start - datetime.timedelta(days=1), self.tzinfo)
+
+    def __eq__(self, other):
+        return (type(self) is type(other) and self.naive_start == other.naive_start and
+                self.tzinfo == other.tzinfo)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash((type(self), self.naive_start, self.tzinfo))
+
+    def __repr__(self):
+        return '<%s: %s - %s>' % (self.__class__.__name__, self.start, self.end)
+
+
+@python_2_unicode_compatible
+class YearRange(PeriodRange):
+    def get_naive_range(self, date):
+        return datetime.datetime(date.year, 1, 1), datetime.datetime(date.year + 1, 1, 1)
+
+    def __str__(self):
+        return '%s' % self.naive_start.year
+
+
+@python_2_unicode_compatible
+class MonthRange(PeriodRange):
+    def get_naive_range(self, date):
+        start = datetime.datetime(date.year, date.month, 1)
+        if date.month == 12:
+            return start, datetime.datetime(date.year + 1, 1, 1)
+        return start, datetime.datetime(date.year, date.month + 1, 1)
+
+    def __str__(self):
+        return '%s %s' % (standardlib_calendar.month_name[self.naive_start.month], self.naive_start.year)
+
+    def get_weeks(self):
+        week = WeekRange(self.naive_start, self.tzinfo)
+        while week.naive_start < self.naive_end:
+            yield week
+            week = week.next()
+
+
+class WeekRange(PeriodRange):
+    def get_naive_range(self, date):
+        if isinstance(date, datetime.datetime):
+            date = date.date()
+        start = datetime.datetime.combine(date, datetime.time.min)
+        if FIRST_DAY_OF_WEEK == 1:
+            # The week begins on Monday
+            start -= datetime.timedelta(days=start.isoweekday() - 1)
+        else:
+            # The week begins on Sunday
+            start -= datetime.timedelta(days=start.isoweekday() % 7)
+        return start, start + datetime.timedelta(days=7)
+
+    def get_days(self):
+        return [DayRange(self.naive_start + datetime.timedelta(days=i), self.tzinfo) for i in range(7)]
+
+
+class DayRange(PeriodRange):
+    def get_naive_range(self, date):
+        if isinstance(date, datetime.datetime):
+            date = date.date()
+        start = datetime.datetime.combine(date, datetime.time.min)
+        return start, datetime.datetime.combine(date + datetime.timedelta(days=1), datetime.time.min)
+
+    @property
+    def date(self):
+        return self.naive_start.date()
+
+    def is_today(self):
+        return self.date == datetime.date.today()
@@ -0,0 +1,573 @@
+"""
+Helpers for turning recurrence rules into occurrence start times.
+
+Nothing in here touches the database; the functions work on
+``dateutil.rrule`` objects and plain datetimes so they can be shared by the
+models, the periods and the utilities.
+"""
+from __future__ import unicode_literals
+import bisect
+import datetime
+import threading
+from collections import OrderedDict
+
+from dateutil import rrule
+from dateutil.tz import tzutc
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .settings import (EXPANSION_BUDGET_PER_EVENT, EXPANSION_BUDGET_PER_PERIOD, EXPANSION_MEMO_SIZE,
+                       RRULE_CACHE_SIZE, RRULE_CHECKPOINT_INTERVAL)
+
+# The distance between two occurrences of a rule of these frequencies that
+# has no BYxxx parameter, for an interval of 1.
+FIXED_STEPS = {
+    'WEEKLY': datetime.timedelta(weeks=1),
+    'DAILY': datetime.timedelta(days=1),
+    'HOURLY': datetime.timedelta(hours=1),
+    'MINUTELY': datetime.timedelta(minutes=1),
+    'SECONDLY': datetime.timedelta(seconds=1),
+}
+
+
+class LRUCache(object):
+    """
+    A small thread safe mapping that keeps at most ``maxsize`` entries,
+    evicting the least recently used one first. ``hits`` and ``misses``
+    count the lookups made through ``get``.
+
+    Subclasses may override ``weigh`` to bound something else than the number
+    of entries.
+    """
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def weigh(self, value):
+        """
+        Returns how much of ``maxsize`` ``value`` takes up.
+        """
+        return 1
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data[key] = value
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        if not self.maxsize:
+            return
+        with self._lock:
+            if key in self._data:
+                self._size -= self.weigh(self._data.pop(key))
+            self._data[key] = value
+            self._size += self.weigh(value)
+            while self._size > self.maxsize:
+                self._size -= self.weigh(self._data.popitem(last=False)[1])
+
+    def discard(self, predicate):
+        """
+        Removes every entry whose key satisfies ``predicate``.
+        """
+        with self._lock:
+            for key in [k for k in self._data if predicate(k)]:
+                self._size -= self.weigh(self._data.pop(key))
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._size = 0
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': self._size,
+            'maxsize': self.maxsize,
+        }
+
+
+def compile_rrule(frequency, params, dtstart):
+    """
+    Builds a ``dateutil.rrule.rrule`` from a ``Rule.frequency`` name and the
+    dictionary returned by ``Rule.get_params``.
+    """
+    return rrule.rrule(getattr(rrule, frequency), dtstart=dtstart, **params)
+
+
+def _microseconds(delta):
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+def _weekdays(params):
+    """
+    The ``byweekday`` param of a rule as a sorted list of integers, or
+    ``None`` if it has one with an ``n`` (e.g. ``+1MO``).
+    """
+    weekdays = params['byweekday']
+    if not isinstance(weekdays, (list, tuple)):
+        weekdays = [weekdays]
+    if any(getattr(wd, 'n', None) for wd in weekdays):
+        return None
+    return sorted(set(getattr(wd, 'weekday', wd) for wd in weekdays))
+
+
+def vectorizable(frequency, params):
+    """
+    Whether ``expand_datetime64`` can expand the rule: ``DAILY``, ``WEEKLY``
+    or ``MONTHLY`` with at most ``interval`` and ``count``, plus a plain
+    ``byweekday`` for the first two.
+    """
+    if numpy is None or frequency not in ('DAILY', 'WEEKLY', 'MONTHLY'):
+        return False
+    if not set(params) <= set(['interval', 'count', 'byweekday']):
+        return False
+    if 'byweekday' in params:
+        return frequency != 'MONTHLY' and _weekdays(params) is not None
+    return True
+
+
+def expand_datetime64(frequency, params, dtstart, start, end, duration, until=None):
+    """
+    Returns the starts and ends of the occurrences lasting ``duration`` that
+    overlap the period ``[start, end)`` as two ``datetime64[us]`` arrays, for
+    a rule accepted by ``vectorizable``. ``until`` is an optional inclusive
+    limit on the starts.
+
+    The arrays hold wall clock times in the time zone of ``dtstart``, which is
+    how dateutil steps through a rule too.
+    """
+    dtstart = dtstart.replace(microsecond=0)
+    one_day = numpy.timedelta64(1, 'D')
+    base = numpy.datetime64(dtstart.replace(tzinfo=None), 'us')
+    base_day = base.astype('M8[D]')
+    time_of_day = base - base_day
+    interval = params.get('interval', 1)
+    count = params.get('count')
+
+    def offset(dt):
+        return base + numpy.timedelta64(_microseconds(dt - dtstart), 'us')
+
+    window_start = offset(start - duration)
+    window_end = offset(end)
+    if until is not None:
+        window_end = min(window_end, offset(until) + numpy.timedelta64(1, 'us'))
+
+    if frequency == 'MONTHLY':
+        base_month = base.astype('M8[M]')
+
+        def period_of(dt):
+            return (dt.astype('M8[M]') - base_month).astype(numpy.int64) // interval
+
+        def candidates(first, last):
+            months = base_month + numpy.arange(first, last) * interval
+            days = months.astype('M8[D]') + (dtstart.day - 1)
+            # months without the day of dtstart are skipped
+            return days[days.astype('M8[M]') == months] + time_of_day
+    else:
+        if frequency == 'WEEKLY':
+            period_start = base_day - dtstart.weekday()
+            length = 7 * interval
+            weekdays = _weekdays(params) if 'byweekday' in params else [dtstart.weekday()]
+        else:
+            period_start = base_day
+            length = interval
+            weekdays = None
+
+        def period_of(dt):
+            return (dt.astype('M8[D]') - period_start).astype(numpy.int64) // length
+
+        def candidates(first, last):
+            days = period_start + numpy.arange(first, last) * length
+            if frequency == 'WEEKLY':
+                days = (days[:, numpy.newaxis] + numpy.array(weekdays)).ravel()
+            elif 'byweekday' in params:
+                # 1970-01-01 was a Thursday
+                days = days[numpy.isin((days.astype(numpy.int64) + 3) % 7, _weekdays(params))]
+            return days + time_of_day
+
+    last = max(period_of(window_end) + 1, 0)
+    if count is None:
+        starts = candidates(max(period_of(window_start), 0), last)
+        starts = starts[starts >= base]
+    else:
+        # the count is taken from the first occurrence, so walk from there in
+        # chunks until it is used up
+        chunks = []
+        seen = 0
+        first = 0
+        chunk = max(count, 64)
+        while seen < count and first < last:
+            found = candidates(first, min(first + chunk, last))
+            found = found[found >= base][:count - seen]
+            seen += len(found)
+            chunks.append(found)
+            first += chunk
+        starts = numpy.concatenate(chunks) if chunks else numpy.array([], dtype='M8[us]')
+    starts = starts[(starts >= window_start) & (starts < window_end)]
+    return starts, starts + numpy.timedelta64(_microseconds(duration), 'us')
+
+
+class RuleSeeker(object):
+    """
+    A compiled rrule that can start iterating at any instant without walking
+    the occurrences before it.
+
+    Rules with a fixed distance between occurrences (``SECONDLY`` through
+    ``WEEKLY`` with at most ``interval`` and ``count``) seek with arithmetic.
+    Other rules keep every ``checkpoint_every``-th occurrence seen so far and
+    restart the rrule at the closest checkpoint, which is valid because every
+    occurrence lies in a period the rule is active in and has the time and
+    day parts the rule derives from ``dtstart``.
+    """
+    def __init__(self, frequency, params, dtstart, checkpoint_every=RRULE_CHECKPOINT_INTERVAL):
+        self.frequency = frequency
+        self.params = params
+        self.rrule = compile_rrule(frequency, params, dtstart)
+        # rrule drops the microseconds of dtstart
+        self.dtstart = dtstart.replace(microsecond=0)
+        self.count = params.get('count')
+        self.step = None
+        if frequency in FIXED_STEPS and set(params) <= set(['interval', 'count']):
+            self.step = FIXED_STEPS[frequency] * params.get('interval', 1)
+        self.vectorizable = vectorizable(frequency, params)
+        self.checkpoint_every = max(checkpoint_every, 1)
+        self._checkpoints = [(0, self.dtstart)]
+        self._checkpoint_starts = [self.dtstart]
+        self._walk = None
+        self._walked = 0
+        self._last_walked = None
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        return iter(self.rrule)
+
+    def after(self, dt, inc=False):
+        """
+        Returns the first occurrence after ``dt`` (or at ``dt`` if ``inc``),
+        or ``None`` if there is none.
+        """
+        for o_start in self.iter_from(dt, inc):
+            return o_start
+        return None
+
+    def iter_from(self, dt, inc=True):
+        """
+        Yields, in order, the occurrences after ``dt`` (and at ``dt`` if
+        ``inc``).
+        """
+        if self.step is not None:
+            return self._iter_fixed(dt, inc)
+        return self._iter_checkpointed(dt, inc)
+
+    def _iter_fixed(self, dt, inc):
+        index = 0
+        if dt > self.dtstart:
+            step = _microseconds(self.step)
+            index = -(-_microseconds(dt - self.dtstart) // step)
+        o_start = self.dtstart + self.step * index
+        if not inc and o_start == dt:
+            index += 1
+            o_start += self.step
+        while self.count is None or index < self.count:
+            yield o_start
+            index += 1
+            try:
+                o_start += self.step
+            except OverflowError:
+                return
+
+    def count_between(self, start, end, until=None):
+        """
+        Returns how many occurrences of a rule with a fixed ``step`` start in
+        ``[start, end)`` and at or before ``until``.
+        """
+        if end <= self.dtstart or (until is not None and until < self.dtstart):
+            return 0
+        step = _microseconds(self.step)
+        first = 0
+        if start > self.dtstart:
+            first = -(-_microseconds(start - self.dtstart) // step)
+        last = -(-_microseconds(end - self.dtstart) // step) - 1
+        if until is not None:
+            last = min(last, _microseconds(until - self.dtstart) // step)
+        if self.count is not None:
+            last = min(last, self.count - 1)
+        return max(last - first + 1, 0)
+
+    def _iter_checkpointed(self, dt, inc):
+        index, restart = self._checkpoint_before(dt)
+        params = self.params
+        if self.count is not None:
+            params = dict(params, count=self.count - index)
+        for o_start in compile_rrule(self.frequency, params, restart):
+            if o_start > dt or (inc and o_start == dt):
+                yield o_start
+
+    def _checkpoint_before(self, dt):
+        """
+        Returns the last ``(index, occurrence)`` checkpoint at or before
+        ``dt``, extending the checkpoints up to ``dt`` first.
+        """
+        with self._lock:
+            if self._walk is None:
+                self._walk = iter(self.rrule)
+            while self._walk is not False and (self._last_walked is None or self._last_walked < dt):
+                try:
+                    o_start = next(self._walk)
+                except StopIteration:
+                    self._walk = False
+                    break
+                if self._walked and self._walked % self.checkpoint_every == 0:
+                    self._checkpoints.append((self._walked, o_start))
+                    self._checkpoint_starts.append(o_start)
+                self._walked += 1
+                self._last_walked = o_start
+            position = bisect.bisect_right(self._checkpoint_starts, dt) - 1
+            return self._checkpoints[max(position, 0)]
+
+
+class RRuleCache(LRUCache):
+    """
+    Process wide cache of compiled rrules keyed by
+    ``(rule id, params, frequency, dtstart)``. Each entry is a
+    ``RuleSeeker`` so the checkpoints of a rule are kept along with it.
+
+    Since the key contains everything the rrule is built from, a stale entry
+    can never be returned; invalidation only frees the slots of rules and
+    anchors that are no longer used.
+    """
+    def get_seeker(self, rule, dtstart):
+        key = (rule.pk, rule.params or '', rule.frequency, dtstart)
+        seeker = self.get(key)
+        if seeker is None:
+            seeker = RuleSeeker(rule.frequency, rule.get_params(), dtstart)
+            seeker.key = key
+            self.set(key, seeker)
+        return seeker
+
+    def get_rrule(self, rule, dtstart):
+        return self.get_seeker(rule, dtstart).rrule
+
+    def invalidate(self, rule_id, dtstart=None):
+        """
+        Drops the entries of ``rule_id``, or only the one anchored at
+        ``dtstart`` if it is given.
+        """
+        if dtstart is None:
+            self.discard(lambda key: key[0] == rule_id)
+        else:
+            self.discard(lambda key: key[0] == rule_id and key[3] == dtstart)
+
+
+rrule_cache = RRuleCache(RRULE_CACHE_SIZE)
+
+
+def expand_rrule(seeker, start, end, duration, until=None):
+    """
+    Yields, in order, the start of every occurrence of the ``RuleSeeker``
+    lasting ``duration`` that overlaps the period ``[start, end)``.
+
+    An occurrence overlaps the period if it starts before ``end`` and ends at
+    or after ``start``, so the walk begins ``duration`` before the period.
+    ``until`` is an optional inclusive limit on the occurrence starts, as used
+    by ``Event.end_recurring_period``.
+
+    Rules that ``vectorizable`` accepts are expanded with NumPy when it is
+    installed.
+    """
+    if seeker.vectorizable:
+        starts, ends = expand_datetime64(seeker.frequency, seeker.params, seeker.dtstart,
+                                         start, end, duration, until)
+        tzinfo = seeker.dtstart.tzinfo
+        for o_start in starts.astype(object):
+            yield o_start.replace(tzinfo=tzinfo)
+        return
+    for o_start in seeker.iter_from(start - duration):
+        if o_start >= end or (until is not None and o_start > until):
+            return
+        yield o_start
+
+
+def month_bucket(dt):
+    """
+    Returns the start of the UTC calendar month of ``dt``, naive if ``dt``
+    is.
+    """
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(tzutc())
+    return dt.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month_bucket(bucket):
+    if bucket.month == 12:
+        return bucket.replace(year=bucket.year + 1, month=1)
+    return bucket.replace(month=bucket.month + 1)
+
+
+class ExpansionMemo(LRUCache):
+    """
+    Process wide memo of the occurrence starts of the seekers of the rrule
+    cache, by UTC calendar month.
+
+    A month is keyed by the key of its seeker, which holds the rule, its
+    params and the start of the event, so that changing an event or a rule
+    only expands the series it moves to. ``maxsize`` bounds the number of
+    occurrence starts kept rather than the number of months. Minutely and
+    secondly rules are not memoized, as a month of them would not fit.
+    """
+    def weigh(self, value):
+        return len(value) + 1
+
+    def get_starts(self, seeker, bucket):
+        """
+        Returns the starts of the occurrences of ``seeker`` in the month
+        beginning at ``bucket``.
+        """
+        key = seeker.key + (bucket,)
+        starts = self.get(key)
+        if starts is None:
+            starts = tuple(expand_rrule(seeker, bucket, next_month_bucket(bucket), datetime.timedelta(0)))
+            self.set(key, starts)
+        return starts
+
+    def expand(self, seeker, start, end, duration, until=None):
+        """
+        Returns what ``expand_rrule`` would, merging the memoized months the
+        period spans. Seekers that don't come from the rrule cache are
+        expanded directly.
+        """
+        if (not self.maxsize or getattr(seeker, 'key', None) is None or end.year >= datetime.MAXYEAR or
+                seeker.frequency in ('MINUTELY', 'SECONDLY')):
+            return expand_rrule(seeker, start, end, duration, until)
+        return self._expand(seeker, start - duration, end, until)
+
+    def _expand(self, seeker, first, end, until):
+        bucket = month_bucket(max(first, seeker.dtstart))
+        while bucket < end and (until is None or bucket <= until):
+            for o_start in self.get_starts(seeker, bucket):
+                if o_start >= end or (until is not None and o_start > until):
+                    return
+                if o_start >= first:
+                    yield o_start
+            bucket = next_month_bucket(bucket)
+
+    def count(self, seeker, start, end, duration, until=None):
+        """
+        Returns how many starts ``expand`` would yield, with arithmetic for
+        rules with a fixed step and by bisecting the memoized months
+        otherwise.
+        """
+        first = start - duration
+        if seeker.step is not None:
+            return seeker.count_between(first, end, until)
+        if (not self.maxsize or getattr(seeker, 'key', None) is None or end.year >= datetime.MAXYEAR or
+                seeker.frequency in ('MINUTELY', 'SECONDLY')):
+            return sum(1 for o_start in expand_rrule(seeker, start, end, duration, until))
+        count = 0
+        bucket = month_bucket(max(first, seeker.dtstart))
+        while bucket < end and (until is None or bucket <= until):
+            starts = self.get_starts(seeker, bucket)
+            last = bisect.bisect_left(starts, end)
+            if until is not None:
+                last = min(last, bisect.bisect_right(starts, until))
+            count += max(last - bisect.bisect_left(starts, first), 0)
+            bucket = next_month_bucket(bucket)
+        return count
+
+    def invalidate(self, rule_id, dtstart=None):
+        """
+        Frees the months of ``rule_id``, or only those of the series
+        anchored at ``dtstart`` if it is given.
+        """
+        if dtstart is None:
+            self.discard(lambda key: key[0] == rule_id)
+        else:
+            self.discard(lambda key: key[0] == rule_id and key[3] == dtstart)
+
+
+expansion_memo = ExpansionMemo(EXPANSION_MEMO_SIZE)
+
+
+class ExpansionBudget(object):
+    """
+    Limits the occurrences an expansion creates to ``per_event`` for each
+    event and ``total`` in all, ``None`` lifting a limit.
+
+    ``truncated`` tells whether a limit has been hit, and the ``exceeded``
+    class attribute counts the budgets of the process that have been.
+    """
+    exceeded = 0
+    _lock = threading.Lock()
+
+    def __init__(self, per_event=EXPANSION_BUDGET_PER_EVENT, total=EXPANSION_BUDGET_PER_PERIOD):
+        self.per_event = per_event
+        self.remaining = total
+        self.truncated = False
+
+    def take(self, iterable, charge=True):
+        """
+        Yields the items of ``iterable`` until a limit is hit. Items taken
+        without ``charge`` only count against the limit of the event.
+        """
+        for position, item in enumerate(iterable):
+            if ((self.per_event is not None and position >= self.per_event) or
+                    (charge and self.remaining == 0)):
+                self._exceed()
+                return
+            if charge and self.remaining is not None:
+                self.remaining -= 1
+            yield item
+
+    def _exceed(self):
+        if self.truncated:
+            return
+        self.truncated = True
+        with self._lock:
+            ExpansionBudget.exceeded += 1
+
+
+def series_span(seeker, duration, until=None):
+    """
+    Returns the start of the first occurrence of the rule of ``seeker``, a
+    ``RuleSeeker``, and the end of its last one. The end is ``None`` when the
+    series is unbounded, i.e. it has neither a ``count`` nor an ``until``
+    limit, and both are ``None`` when the series is empty.
+
+    The last occurrence of a rule with a fixed step is found with arithmetic,
+    so that bounded ``MINUTELY`` or ``HOURLY`` series are not walked.
+    """
+    first = seeker.after(seeker.dtstart, inc=True)
+    if first is None or (until is not None and first > until):
+        return None, None
+    if seeker.count is None and until is None:
+        return first, None
+    if seeker.step is not None:
+        index = None if seeker.count is None else seeker.count - 1
+        if until is not None:
+            before_until = _microseconds(until - seeker.dtstart) // _microseconds(seeker.step)
+            index = before_until if index is None else min(index, before_until)
+        last = seeker.dtstart + seeker.step * index
+    elif until is not None:
+        last = seeker.rrule.before(until, inc=True)
+    else:
+        last = seeker.rrule[-1]
+    return first, last + duration
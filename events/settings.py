@@ -28,6 +28,53 @@ DEFAULT_SETTINGS = {
     'CALENDAR_RELATION_MODELS': [],
     'DEFAULT_RULE_ID': 1,
     'BASE_CLASSES': None,
+
+    # Maximum number of compiled rrules kept in the process wide cache used by
+    # Event.get_rrule_object. Set to 0 to disable the cache.
+    'RRULE_CACHE_SIZE': 1000,
+
+    # Rules that can't seek with arithmetic remember every
+    # RRULE_CHECKPOINT_INTERVAL-th occurrence and restart from the closest one
+    # instead of walking the series from its first occurrence.
+    'RRULE_CHECKPOINT_INTERVAL': 100,
+
+    # The occurrences of the rules in the rrule cache are memoized by UTC
+    # calendar month, keeping at most EXPANSION_MEMO_SIZE occurrence starts
+    # in the process. Set to 0 to disable the memo.
+    'EXPANSION_MEMO_SIZE': 200000,
+
+    # Expanding a period creates at most EXPANSION_BUDGET_PER_EVENT
+    # occurrences for a single event and EXPANSION_BUDGET_PER_PERIOD in all;
+    # past that the period is marked as truncated and holds the occurrences
+    # created so far. None lifts a limit.
+    'EXPANSION_BUDGET_PER_EVENT': 10000,
+    'EXPANSION_BUDGET_PER_PERIOD': 100000,
+
+    # Keep the OccurrenceIndex table up to date and use it to answer periods
+    # that fall within its rolling horizon. The horizon reaches
+    # OCCURRENCE_INDEX_HISTORY_DAYS into the past and
+    # OCCURRENCE_INDEX_HORIZON_DAYS into the future; roll it forward daily
+    # with the update_occurrence_index command.
+    'OCCURRENCE_INDEX_ENABLED': False,
+    'OCCURRENCE_INDEX_HISTORY_DAYS': 31,
+    'OCCURRENCE_INDEX_HORIZON_DAYS': 365,
+
+    # Name of the Django cache in which the occurrences of periods are kept
+    # between requests, for PERIOD_CACHE_TIMEOUT seconds. None disables the
+    # cache. Requests missing the same period wait up to
+    # PERIOD_CACHE_LOCK_TIMEOUT seconds for the first one to compute it.
+    'PERIOD_CACHE_ALIAS': None,
+    'PERIOD_CACHE_TIMEOUT': 60 * 60,
+    'PERIOD_CACHE_LOCK_TIMEOUT': 10,
+
+    # Number of days of original starts covered by each chunk of persisted
+    # occurrences loaded by occurrences_after as it moves forward.
+    'PERSISTED_OCCURRENCE_CHUNK_DAYS': 28,
+
+    # Let the database generate the occurrences of events without a rule or
+    # with a fixed step rule in the calendar_events feed, on SQLite and
+    # PostgreSQL. Other events are still expanded in Python.
+    'SQL_EXPANSION_ENABLED': False,
 }
 
 USER_SETTINGS = DEFAULT_SETTINGS.copy()
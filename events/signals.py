@@ -1,5 +1,8 @@
-from django.db.models.signals import pre_save
-from models import Event, Calendar
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from models import Event, Calendar, CalendarRelation, EventRelation, Rule, Occurrence, OccurrenceIndex
+from cache import period_cache
+from recurrence import expansion_memo, rrule_cache
+from settings import OCCURRENCE_INDEX_ENABLED
 
 
 def optionnal_calendar(sender, **kwargs):
@@ -18,3 +21,123 @@ def optionnal_calendar(sender, **kwargs):
     return True
 
 pre_save.connect(optionnal_calendar)
+
+
+def invalidate_rule_rrules(sender, **kwargs):
+    rrule_cache.invalidate(kwargs['instance'].pk)
+    expansion_memo.invalidate(kwargs['instance'].pk)
+
+
+def invalidate_event_rrule(sender, **kwargs):
+    """
+    Frees the compiled rrule of the anchor the event is moving away from.
+    """
+    event = kwargs['instance']
+    if event.pk is None:
+        return
+    for rule_id, start in Event.objects.filter(pk=event.pk).values_list('rule_id', 'start'):
+        if rule_id is not None and (rule_id, start) != (event.rule_id, event.start):
+            rrule_cache.invalidate(rule_id, start)
+            expansion_memo.invalidate(rule_id, start)
+
+post_save.connect(invalidate_rule_rrules, sender=Rule)
+post_delete.connect(invalidate_rule_rrules, sender=Rule)
+pre_save.connect(invalidate_event_rrule, sender=Event)
+
+
+def update_rule_series_spans(sender, **kwargs):
+    if not kwargs.get('raw'):
+        for event in kwargs['instance'].events.all():
+            event.update_series_span()
+            event.update_next_occurrence()
+
+
+def widen_occurrence_series_span(sender, **kwargs):
+    """
+    Persisted occurrences may be moved outside of the series span of their
+    event. Deleting one leaves the span as it is, a span wider than needed
+    only costing an expansion that finds nothing.
+    """
+    if not kwargs.get('raw'):
+        occurrence = kwargs['instance']
+        for event in Event.objects.filter(pk=occurrence.event_id):
+            event.widen_series_span(occurrence)
+
+post_save.connect(update_rule_series_spans, sender=Rule)
+post_save.connect(widen_occurrence_series_span, sender=Occurrence)
+
+
+def index_event_occurrences(sender, **kwargs):
+    if not kwargs.get('raw'):
+        OccurrenceIndex.objects.index_event(kwargs['instance'])
+
+
+def index_rule_events(sender, **kwargs):
+    if not kwargs.get('raw'):
+        for event in kwargs['instance'].events.prefetch_related('occurrence_set'):
+            OccurrenceIndex.objects.index_event(event)
+
+
+def index_persisted_occurrence(sender, **kwargs):
+    if not kwargs.get('raw'):
+        OccurrenceIndex.objects.index_occurrence(kwargs['instance'])
+
+
+def unindex_persisted_occurrence(sender, **kwargs):
+    OccurrenceIndex.objects.unindex_occurrence(kwargs['instance'])
+
+# Deleting an event or a rule cascades to the index rows through the foreign
+# keys. Persisted occurrences are unindexed before they are deleted, while
+# their rows still point to them.
+if OCCURRENCE_INDEX_ENABLED:
+    post_save.connect(index_event_occurrences, sender=Event)
+    post_save.connect(index_rule_events, sender=Rule)
+    post_save.connect(index_persisted_occurrence, sender=Occurrence)
+    pre_delete.connect(unindex_persisted_occurrence, sender=Occurrence)
+
+
+def remember_event_calendar(sender, **kwargs):
+    """
+    Keeps the calendar an event is moving away from, whose cached periods
+    have to go as well.
+    """
+    event = kwargs['instance']
+    event._previous_calendar_ids = list(
+        Event.objects.filter(pk=event.pk).values_list('calendar_id', flat=True)) if event.pk else []
+
+
+def invalidate_event_periods(sender, **kwargs):
+    event = kwargs['instance']
+    period_cache.bump([event.calendar_id] + getattr(event, '_previous_calendar_ids', []))
+
+
+def invalidate_rule_periods(sender, **kwargs):
+    rule = kwargs['instance']
+    period_cache.bump(Event.objects.filter(rule=rule).values_list('calendar_id', flat=True).distinct())
+
+
+def invalidate_calendar_periods(sender, **kwargs):
+    period_cache.bump([kwargs['instance'].pk])
+
+
+def invalidate_related_calendar_periods(sender, **kwargs):
+    """
+    Handles the changes of occurrences, event relations and calendar
+    relations, which may change the events ``GET_EVENTS_FUNC`` returns.
+    """
+    instance = kwargs['instance']
+    if hasattr(instance, 'calendar_id'):
+        period_cache.bump([instance.calendar_id])
+    else:
+        period_cache.bump(Event.objects.filter(pk=instance.event_id).values_list('calendar_id', flat=True))
+
+if period_cache is not None:
+    pre_save.connect(remember_event_calendar, sender=Event)
+    post_save.connect(invalidate_event_periods, sender=Event)
+    post_delete.connect(invalidate_event_periods, sender=Event)
+    post_save.connect(invalidate_rule_periods, sender=Rule)
+    post_save.connect(invalidate_calendar_periods, sender=Calendar)
+    post_delete.connect(invalidate_calendar_periods, sender=Calendar)
+    for model in (Occurrence, EventRelation, CalendarRelation):
+        post_save.connect(invalidate_related_calendar_periods, sender=model)
+        post_delete.connect(invalidate_related_calendar_periods, sender=model)
@@ -0,0 +1,240 @@
+"""
+Expansion of simple rules by the database.
+
+The occurrences of events without a rule or with a rule that only steps by a
+fixed amount of time (``WEEKLY``, ``DAILY``, ``HOURLY``... with an optional
+``interval`` and ``count``) are generated by a recursive common table
+expression, which starts from the first step that can reach the requested
+range. Generated occurrences replaced by a persisted ``Occurrence`` are left
+out by an anti-join, and the persisted ones overlapping the range are added.
+The result is plain SQL, so that it can be filtered, counted or joined to
+other tables such as ``EventRelation`` in the same query.
+
+Only SQLite and PostgreSQL are supported; the events of other databases, as
+well as those of more complex rules, are expanded in Python.
+"""
+from six.moves.builtins import object
+from django.conf import settings
+from django.db import connections, router
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from events.recurrence import FIXED_STEPS
+from events.utils import EventListManager, occurrence_sort_key
+
+# Per database vendor, the SQL of the microseconds since the Unix epoch of a
+# datetime, of the datetime, as stored by Django, from such a number of
+# microseconds, and of false. SQLite stores datetimes as text, which its date
+# functions only handle to the millisecond, so the microseconds are read and
+# written as text.
+DIALECTS = {
+    'sqlite': {
+        'microseconds': ("(CAST(strftime('%%s', substr({0}, 1, 19)) AS INTEGER) * 1000000 + "
+                         "CAST(substr({0}, 21) AS INTEGER))"),
+        'datetime': ("(strftime('%%Y-%%m-%%d %%H:%%M:%%S', {0} / 1000000, 'unixepoch') || "
+                     "CASE WHEN {0} %% 1000000 = 0 THEN '' ELSE '.' || substr('00000' || ({0} %% 1000000), -6) END)"),
+        'false': '0',
+    },
+    'postgresql': {
+        'microseconds': 'CAST(ROUND(EXTRACT(EPOCH FROM {0}) * 1000000) AS BIGINT)',
+        'datetime': "(TIMESTAMP 'epoch' + ({0}) * INTERVAL '1 microsecond')",
+        'false': 'FALSE',
+    },
+}
+
+# The columns of the rows returned by ``SQLExpansion.get_sql``
+COLUMNS = ('event_id', 'start', 'end', 'original_start', 'original_end', 'occurrence_id', 'cancelled')
+
+
+def rule_step(rule):
+    """
+    Returns the number of seconds between the occurrences of ``rule`` and its
+    count, or ``None`` if it can't be expanded in SQL.
+    """
+    params = rule.get_params()
+    if rule.frequency not in FIXED_STEPS or not set(params) <= set(['interval', 'count']):
+        return None
+    step = FIXED_STEPS[rule.frequency] * params.get('interval', 1)
+    seconds = step.days * 86400 + step.seconds
+    if seconds <= 0:
+        return None
+    return seconds, params.get('count')
+
+
+def expansion_sql(dialect, quote_name, event_table, occurrence_table, events_sql, steps):
+    """
+    Returns the SQL of the occurrences of the events selected by
+    ``events_sql`` whose rule is one of ``steps``, a list of
+    ``(rule_id, seconds, count)``, or that don't have a rule.
+
+    It takes the start and end of the range, then the parameters of
+    ``events_sql``, then the end and start of the range again.
+
+    The series are stepped through in microseconds since the epoch. As in
+    Python, a persisted occurrence replaces the generated one with the same
+    original start and end, and cancelled persisted occurrences are only
+    included when they replace a generated occurrence of the range.
+    """
+    us, dt = dialect['microseconds'].format, dialect['datetime'].format
+    e, o, end = quote_name(event_table), quote_name(occurrence_table), quote_name('end')
+    if steps:
+        steps_sql = ' UNION ALL '.join(
+            ['SELECT %d, CAST(%d AS BIGINT), CAST(%s AS INTEGER)' % (
+                pk, seconds * 1000000, 'NULL' if count is None else int(count))
+             for pk, seconds, count in steps])
+    else:
+        steps_sql = 'SELECT CAST(NULL AS INTEGER), CAST(NULL AS BIGINT), CAST(NULL AS INTEGER) WHERE 1 = 0'
+    return '''
+WITH RECURSIVE
+steps (rule_id, step, count_) AS ({steps}),
+range_ (start_, end_) AS (SELECT %s, %s),
+bounds (start_, end_) AS (SELECT {range_start}, {range_end} FROM range_),
+anchors (event_id, start_, end_, until_, step, count_, n) AS (
+    SELECT e.id, {event_start}, {event_end}, {event_until}, s.step, s.count_,
+           CASE WHEN s.step IS NULL OR b.start_ <= {event_end} THEN 0
+                ELSE (b.start_ - {event_end} + s.step - 1) / s.step END
+    FROM {e} e CROSS JOIN bounds b LEFT JOIN steps s ON s.rule_id = e.rule_id
+    WHERE e.id IN ({events}) AND (e.rule_id IS NULL OR s.rule_id IS NOT NULL)
+),
+series (event_id, start_, end_, until_, step, count_, n) AS (
+    SELECT event_id, start_ + n * COALESCE(step, 0), end_ + n * COALESCE(step, 0), until_, step, count_, n
+    FROM anchors
+    UNION ALL
+    SELECT s.event_id, s.start_ + s.step, s.end_ + s.step, s.until_, s.step, s.count_, s.n + 1
+    FROM series s CROSS JOIN bounds b
+    WHERE s.step IS NOT NULL AND s.start_ + s.step < b.end_
+      AND (s.count_ IS NULL OR s.n + 1 < s.count_)
+      AND (s.until_ IS NULL OR s.start_ + s.step <= s.until_)
+),
+generated (event_id, start_, end_) AS (
+    SELECT s.event_id, {series_start}, {series_end}
+    FROM series s CROSS JOIN bounds b
+    WHERE s.start_ < b.end_ AND s.end_ >= b.start_
+      AND (s.count_ IS NULL OR s.n < s.count_)
+      AND (s.step IS NULL OR s.until_ IS NULL OR s.start_ <= s.until_)
+)
+SELECT g.event_id AS {columns[0]}, g.start_ AS {columns[1]}, g.end_ AS {columns[2]},
+       g.start_ AS {columns[3]}, g.end_ AS {columns[4]}, NULL AS {columns[5]}, {false} AS {columns[6]}
+FROM generated g
+WHERE NOT EXISTS (
+    SELECT 1 FROM {o} o
+    WHERE o.event_id = g.event_id AND o.original_start = g.start_ AND o.original_end = g.end_)
+UNION ALL
+SELECT o.event_id, o.start, o.{end}, o.original_start, o.original_end, o.id, o.cancelled
+FROM {o} o
+WHERE o.event_id IN (SELECT event_id FROM anchors) AND o.start < %s AND o.{end} >= %s
+  AND (o.cancelled = {false} OR EXISTS (
+      SELECT 1 FROM generated g
+      WHERE g.event_id = o.event_id AND g.start_ = o.original_start AND g.end_ = o.original_end))
+'''.format(
+        steps=steps_sql, end=end, e=e, o=o, events=events_sql, false=dialect['false'],
+        columns=[quote_name(c) for c in COLUMNS],
+        range_start=us('start_'), range_end=us('end_'),
+        event_start=us('e.start'), event_end=us('e.%s' % end), event_until=us('e.end_recurring_period'),
+        series_start=dt('s.start_'), series_end=dt('s.end_'))
+
+
+def _to_datetime(value):
+    if not hasattr(value, 'tzinfo'):
+        value = parse_datetime(value)
+    if settings.USE_TZ and timezone.is_naive(value):
+        value = timezone.make_aware(value, timezone.utc)
+    return value
+
+
+class SQLExpansion(object):
+    """
+    The occurrences of the ``events`` QuerySet overlapping ``[start, end)``,
+    those of simple rules being generated by the database.
+
+    As with the Python expansion, cancelled persisted occurrences are
+    included when they replace a generated occurrence of the range, with
+    their ``cancelled`` column set.
+    """
+    def __init__(self, events, start, end):
+        from events.models import Event, Occurrence, Rule
+        self.events = events
+        self.start = start
+        self.end = end
+        self.using = events.db or router.db_for_read(Event)
+        self.connection = connections[self.using]
+        self.dialect = DIALECTS.get(self.connection.vendor)
+        self.steps = []
+        if self.dialect is not None:
+            rules = Rule.objects.using(self.using).filter(
+                frequency__in=list(FIXED_STEPS),
+                pk__in=events.filter(rule__isnull=False).values('rule_id'))
+            for rule in rules:
+                step = rule_step(rule)
+                if step is not None:
+                    self.steps.append((rule.pk,) + step)
+        self.event_model = Event
+        self.occurrence_model = Occurrence
+
+    @property
+    def supported(self):
+        return self.dialect is not None
+
+    def get_python_events(self):
+        """
+        Returns the events that are expanded in Python.
+        """
+        if not self.supported:
+            return self.events
+        return self.events.filter(rule__isnull=False).exclude(rule_id__in=[s[0] for s in self.steps])
+
+    def get_sql(self):
+        """
+        Returns the ``(sql, params)`` of the rows of the occurrences expanded
+        by the database, whose columns are listed in ``COLUMNS``.
+        """
+        events_sql, events_params = self.events.order_by().values('pk').query.sql_with_params()
+        sql = expansion_sql(
+            self.dialect, self.connection.ops.quote_name, self.event_model._meta.db_table,
+            self.occurrence_model._meta.db_table, events_sql, self.steps)
+        start, end = self.start, self.end
+        return sql, (start, end) + tuple(events_params) + (end, start)
+
+    def count(self, cancelled=False):
+        """
+        Returns how many occurrences there are, leaving cancelled ones out
+        unless ``cancelled`` is true.
+        """
+        total = 0
+        if self.supported:
+            sql, params = self.get_sql()
+            sql = 'SELECT COUNT(*) FROM (%s) occurrences' % sql
+            if not cancelled:
+                sql += ' WHERE occurrences.cancelled = %s' % self.dialect['false']
+            with self.connection.cursor() as cursor:
+                cursor.execute(sql, params)
+                total = cursor.fetchone()[0]
+        for event in self.get_python_events():
+            total += event.count_between(self.start, self.end, cancelled)
+        return total
+
+    def get_occurrences(self):
+        """
+        Returns the sorted list of occurrences, persisted ones replacing those
+        they stand for.
+        """
+        occurrences = []
+        if self.supported:
+            sql, params = self.get_sql()
+            with self.connection.cursor() as cursor:
+                cursor.execute(sql, params)
+                rows = cursor.fetchall()
+            events = self.event_model._default_manager.using(self.using).in_bulk(
+                set(row[0] for row in rows))
+            persisted = self.occurrence_model._default_manager.using(self.using).in_bulk(
+                [row[5] for row in rows if row[5] is not None])
+            for event_id, start, end, original_start, original_end, pk, cancelled in rows:
+                if pk is not None:
+                    occurrence = persisted[pk]
+                    occurrence.event = events[event_id]
+                else:
+                    occurrence = events[event_id]._create_occurrence(_to_datetime(start), _to_datetime(end))
+                occurrences.append(occurrence)
+        occurrences.extend(EventListManager(self.get_python_events()).occurrences_between(self.start, self.end))
+        occurrences.sort(key=occurrence_sort_key)
+        return occurrences
@@ -1,11 +1,13 @@
 import datetime
+import functools
 from django.conf import settings
 from django import template
 from django.core.urlresolvers import reverse
 from django.utils.dateformat import format
 from ..settings import CHECK_PERMISSION_FUNC
 from ..models import Calendar, Rule
-from ..periods import weekday_names, weekday_abbrs
+from ..periods import ExpansionContext, weekday_names, weekday_abbrs
+from ..ranges import PeriodRange
 
 register = template.Library()
 
@@ -14,14 +16,20 @@ register = template.Library()
 def month_table(context, calendar, month, size="regular", shift=None):
 
     if shift:
+        if month.context is None:
+            # expand the neighbouring months along with this one, as views
+            # showing a shifted month usually show the others too
+            ExpansionContext.share([month], adjacent=1)
         if shift == -1:
             month = month.prev()
         if shift == 1:
             month = month.next()
     if size == "small":
         context['day_names'] = weekday_abbrs
+        context['weeks'] = month.range.get_weeks()
     else:
         context['day_names'] = weekday_names
+        context['weeks'] = month.get_weeks()
     context['calendar'] = calendar
     context['month'] = month
     context['size'] = size
@@ -31,11 +39,18 @@ def month_table(context, calendar, month, size="regular", shift=None):
 
 @register.inclusion_tag("events/_day_cell.html",  takes_context=True)
 def day_cell(context,  calendar, day, month, size="regular"):
+    if size == "small":
+        # small cells only tell busy days from free ones, which the month
+        # knows without creating any occurrence
+        busy = functools.partial(month.is_busy_day, day.date)
+    else:
+        busy = day.has_occurrences
     context.update({
         'calendar': calendar,
         'day': day,
         'month': month,
-        'size': size
+        'size': size,
+        'busy': busy,
     })
     return context
 
@@ -221,14 +236,25 @@ def querystring_for_date(date, num=6):
 def prev_url(target, slug, period):
     return '%s%s' % (
         reverse(target, kwargs=dict(calendar_slug=slug)),
-            querystring_for_date(period.prev().start))
+            querystring_for_date(_period_range(period).prev().start))
 
 
 @register.simple_tag
 def next_url(target, slug, period):
     return '%s%s' % (
         reverse(target, kwargs=dict(calendar_slug=slug)),
-            querystring_for_date(period.next().start))
+            querystring_for_date(_period_range(period).next().start))
+
+
+def _period_range(period):
+    """
+    Returns the boundaries of ``period``, so that navigating does not build
+    and expand the neighbouring periods. Periods without a range are
+    returned as they are.
+    """
+    if isinstance(period, PeriodRange):
+        return period
+    return getattr(period, 'range', None) or period
 
 
 @register.inclusion_tag("events/_prevnext.html", takes_context=True)
@@ -265,6 +291,7 @@ def _cook_occurrences(period, occs, width, height):
         height - height of the table (px)
     """
     last = {}
+    occs = [o.promote() for o in occs]
     # find out which occurrences overlap
     for o in occs[:]:
         o.data = period.classify_occurrence(o)
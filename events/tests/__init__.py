@@ -1,5 +1,6 @@
 from test_models import *
 from test_utils import *
 from test_periods import *
+from test_cache import *
 from test_templatetags import *
 from test_views import *
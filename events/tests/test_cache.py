@@ -0,0 +1,111 @@
+from django.core.cache import caches
+from django.test import TestCase
+from events import signals
+from events.cache import PeriodCache
+from events.models import Event, Rule, Calendar
+from events.periods import Period, Month
+from events.recurrence import ExpansionBudget
+import datetime
+import time
+
+
+class TestPeriodCache(TestCase):
+
+    def setUp(self):
+        rule = Rule(frequency="WEEKLY")
+        rule.save()
+        self.calendar = Calendar(name="MyCal")
+        self.calendar.save()
+        self.event = Event(**{
+            'title': 'Recent Event',
+            'start': datetime.datetime(2008, 1, 5, 8, 0),
+            'end': datetime.datetime(2008, 1, 5, 9, 0),
+            'end_recurring_period': datetime.datetime(2008, 5, 5, 0, 0),
+            'rule': rule,
+            'calendar': self.calendar,
+        })
+        self.event.save()
+        caches['default'].clear()
+        self.cache = PeriodCache('default', lock_timeout=0.2)
+        self.computed = []
+
+    def get_occurrences(self):
+        month = Month(self.calendar.events.all(), datetime.datetime(2008, 2, 1))
+
+        def compute():
+            self.computed.append(month)
+            return month._expand_occurrences()
+        return self.cache.get_occurrences(month, compute)
+
+    def test_cached_between_periods(self):
+        occurrences = self.get_occurrences()
+        self.assertEqual(len(occurrences), 4)
+        self.assertEqual(self.get_occurrences(), occurrences)
+        self.assertEqual(len(self.computed), 1)
+
+    def test_peek(self):
+        month = Month(self.calendar.events.all(), datetime.datetime(2008, 2, 1))
+        self.assertEqual(self.cache.peek(month), None)
+        occurrences = self.get_occurrences()
+        self.assertEqual(self.cache.peek(month), occurrences)
+        self.assertEqual(len(self.computed), 1)
+
+    def test_bump_invalidates(self):
+        self.get_occurrences()
+        self.cache.bump([self.calendar.pk])
+        self.get_occurrences()
+        self.assertEqual(len(self.computed), 2)
+
+    def test_signals_bump_generation(self):
+        generations = self.cache.get_generations([self.calendar.pk])
+        original_cache, signals.period_cache = signals.period_cache, self.cache
+        try:
+            signals.invalidate_event_periods(Event, instance=self.event)
+        finally:
+            signals.period_cache = original_cache
+        self.assertNotEqual(self.cache.get_generations([self.calendar.pk]), generations)
+
+    def test_waits_for_locked_entry(self):
+        month = Month(self.calendar.events.all(), datetime.datetime(2008, 2, 1))
+        key = self.cache.make_key(month)
+        caches['default'].add('%s:lock' % key, True)
+        self.assertEqual(self.cache.get_occurrences(month, lambda: []), [])
+        caches['default'].set(key, ['cached'])
+        self.assertEqual(self.cache.get_occurrences(month, lambda: []), ['cached'])
+
+    def test_uncacheable_entry_releases_waiters(self):
+        cache = PeriodCache('default', lock_timeout=5)
+        month = Month(self.calendar.events.all(), datetime.datetime(2008, 2, 1))
+
+        def truncated():
+            month._budget = ExpansionBudget(per_event=1)
+            return list(month._budget.take(['first', 'second']))
+
+        self.assertEqual(cache.get_occurrences(month, truncated), ['first'])
+        self.assertTrue(month.truncated)
+        started = time.time()
+        self.assertEqual(cache.get_occurrences(month, lambda: ['again']), ['again'])
+        self.assertTrue(time.time() - started < 1)
+
+    def test_failed_compute_releases_waiters(self):
+        cache = PeriodCache('default', lock_timeout=5)
+        month = Month(self.calendar.events.all(), datetime.datetime(2008, 2, 1))
+
+        def fail():
+            raise ValueError
+
+        self.assertRaises(ValueError, cache.get_occurrences, month, fail)
+        started = time.time()
+        self.assertEqual(cache.get_occurrences(month, lambda: ['again']), ['again'])
+        self.assertTrue(time.time() - started < 1)
+
+    def test_period_reads_cache(self):
+        original_cache, Period.cache = Period.cache, self.cache
+        try:
+            occurrences = Month(self.calendar.events.all(), datetime.datetime(2008, 2, 1)).occurrences
+            with self.assertNumQueries(1):
+                # looks up the calendars of the events only
+                cached = Month(self.calendar.events.all(), datetime.datetime(2008, 2, 1)).occurrences
+        finally:
+            Period.cache = original_cache
+        self.assertEqual(cached, occurrences)
@@ -1,6 +1,16 @@
+from itertools import islice
+from unittest import skipUnless
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
-from events.models import Event, Rule, Calendar
+from django.utils import timezone
+from events.models import (Event, EventRelation, Rule, Calendar, CalendarRelation,
+                           Occurrence, OccurrenceIndex, OccurrenceView)
+from events.models.event import NEXT_OCCURRENCE_MARGIN
 from events.periods import Period
+from events.recurrence import (ExpansionBudget, ExpansionMemo, RuleSeeker, compile_rrule, expand_datetime64,
+                               expand_rrule, numpy, rrule_cache)
+from events.utils import EventListManager
 import datetime
 
 
@@ -33,6 +43,21 @@ class TestEvent(TestCase):
         self.assertEquals(["%s to %s" % (o.start, o.end) for o in occurrences],
             ['2008-01-12 08:00:00 to 2008-01-12 09:00:00', '2008-01-19 08:00:00 to 2008-01-19 09:00:00'])
 
+    def test_recurring_event_get_occurrences_no_duplicates(self):
+        recurring_event = Event(**self.recurring_data)
+        occurrences = recurring_event.get_occurrences(start=datetime.datetime(2008, 1, 12, 8, 0),
+                                    end=datetime.datetime(2008, 1, 12, 8, 30))
+        self.assertEquals(["%s to %s" % (o.start, o.end) for o in occurrences],
+            ['2008-01-12 08:00:00 to 2008-01-12 09:00:00'])
+
+    def test_recurring_event_get_occurrences_long_duration(self):
+        self.recurring_data['end'] = datetime.datetime(2008, 1, 5, 18, 0)
+        recurring_event = Event(**self.recurring_data)
+        occurrences = recurring_event.get_occurrences(start=datetime.datetime(2008, 1, 12, 17, 0),
+                                    end=datetime.datetime(2008, 1, 12, 17, 30))
+        self.assertEquals(["%s to %s" % (o.start, o.end) for o in occurrences],
+            ['2008-01-12 08:00:00 to 2008-01-12 18:00:00'])
+
     def test_event_get_occurrences_after(self):
         recurring_event = Event(**self.recurring_data)
         recurring_event.save()
@@ -123,3 +148,453 @@ class TestOccurrence(TestCase):
         occurrences = self.recurring_event.get_occurrences(start=self.start,
                                     end=self.end)
         self.assertFalse(occurrences[2].cancelled)
+
+    def test_generated_occurrences_are_views(self):
+        occurrences = self.recurring_event.get_occurrences(start=self.start,
+                                    end=self.end)
+        generated = occurrences[0]
+        self.assertTrue(isinstance(generated, OccurrenceView))
+        self.assertFalse(hasattr(generated, '__dict__'))
+        self.assertEqual(generated.title, self.recurring_event.title)
+        self.assertEqual(generated.original_start, generated.start)
+        promoted = generated.promote()
+        self.assertTrue(isinstance(promoted, Occurrence))
+        self.assertTrue(promoted is generated.promote())
+        self.assertEqual(promoted.pk, None)
+        self.assertEqual(promoted, generated)
+        generated.save()
+        self.assertTrue(generated.pk)
+        occurrences = self.recurring_event.get_occurrences(start=self.start,
+                                    end=self.end)
+        self.assertEqual(occurrences[0].pk, promoted.pk)
+
+
+class TestRRuleCache(TestCase):
+    def setUp(self):
+        rrule_cache.clear()
+        self.rule = Rule(frequency="WEEKLY", params="interval:2")
+        self.rule.save()
+        cal = Calendar(name="MyCal")
+        cal.save()
+        self.event = Event(**{
+                'title': 'Recent Event',
+                'start': datetime.datetime(2008, 1, 5, 8, 0),
+                'end': datetime.datetime(2008, 1, 5, 9, 0),
+                'rule': self.rule,
+                'calendar': cal
+               })
+        self.event.save()
+
+    def test_compiled_rule_is_reused(self):
+        rule = self.event.get_rrule_object()
+        self.assertTrue(self.event.get_rrule_object() is rule)
+        self.assertEqual(rrule_cache.misses, 1)
+        self.assertEqual(rrule_cache.hits, 1)
+
+    def test_params_are_part_of_the_key(self):
+        seeker = rrule_cache.get_seeker(self.rule, self.event.start)
+        self.rule.params = "interval:3"
+        other = rrule_cache.get_seeker(self.rule, self.event.start)
+        self.assertFalse(other is seeker)
+        self.assertEqual(other.key[1], "interval:3")
+
+    def test_rule_save_invalidates(self):
+        self.event.get_rrule_object()
+        self.assertEqual(len(rrule_cache), 1)
+        self.rule.params = "interval:3"
+        self.rule.save()
+        self.assertEqual(len(rrule_cache), 0)
+        occurrences = self.event.get_occurrences(datetime.datetime(2008, 1, 5),
+                                                 datetime.datetime(2008, 2, 1))
+        self.assertEqual([o.start for o in occurrences],
+            [datetime.datetime(2008, 1, 5, 8, 0), datetime.datetime(2008, 1, 26, 8, 0)])
+
+
+class TestRuleSeeker(TestCase):
+    def assertSeeksLikeRRule(self, frequency, params, checkpoint_every=3):
+        dtstart = datetime.datetime(2008, 1, 5, 8, 0)
+        seeker = RuleSeeker(frequency, params, dtstart, checkpoint_every)
+        expected = list(compile_rrule(frequency, params, dtstart)[:43]) + [None]
+        for position, o_start in enumerate(o for o in expected[:40] if o):
+            self.assertEqual(seeker.after(o_start, inc=True), o_start)
+            self.assertEqual(seeker.after(o_start + datetime.timedelta(seconds=1)),
+                             expected[position + 1])
+            self.assertEqual(list(islice(seeker.iter_from(o_start, inc=False), 3)),
+                             [o for o in expected[position + 1:position + 4] if o])
+
+    def test_fixed_interval_rules(self):
+        self.assertSeeksLikeRRule("DAILY", {'interval': 3})
+        self.assertSeeksLikeRRule("HOURLY", {'interval': 5, 'count': 30})
+        self.assertEqual(RuleSeeker("DAILY", {}, datetime.datetime(2008, 1, 5)).step,
+                         datetime.timedelta(days=1))
+
+    def test_checkpointed_rules(self):
+        self.assertSeeksLikeRRule("WEEKLY", {'interval': 2, 'byweekday': [0, 2]})
+        self.assertSeeksLikeRRule("MONTHLY", {'byweekday': [0, 1, 2, 3, 4], 'bysetpos': -1, 'count': 25})
+        self.assertSeeksLikeRRule("YEARLY", {'bymonth': [2, 8], 'bymonthday': 29})
+
+    def test_get_occurrence_far_from_start(self):
+        rule = Rule(frequency="DAILY")
+        rule.save()
+        event = Event(title='Daily', start=datetime.datetime(1990, 1, 1, 8, 0),
+                      end=datetime.datetime(1990, 1, 1, 9, 0), rule=rule,
+                      calendar=Calendar.objects.create(name="MyCal"))
+        event.save()
+        occurrence = event.get_occurrence(datetime.datetime(2030, 6, 1, 8, 0))
+        self.assertEqual(occurrence.end, datetime.datetime(2030, 6, 1, 9, 0))
+        self.assertEqual(event.get_occurrence(datetime.datetime(2030, 6, 1, 8, 30)), None)
+
+
+class TestExpansionMemo(TestCase):
+    def setUp(self):
+        self.rule = Rule(frequency="WEEKLY", params="byweekday:1,4")
+        self.rule.save()
+        self.seeker = rrule_cache.get_seeker(self.rule, datetime.datetime(2008, 1, 1, 8, 0))
+        self.memo = ExpansionMemo(1000)
+
+    def test_expands_like_rrule(self):
+        duration = datetime.timedelta(hours=40)
+        for start, end, until in [
+                (datetime.datetime(2008, 1, 20), datetime.datetime(2008, 4, 2), None),
+                (datetime.datetime(2008, 2, 29, 9, 0), datetime.datetime(2008, 3, 1), None),
+                (datetime.datetime(2008, 1, 1), datetime.datetime(2009, 1, 1), datetime.datetime(2008, 5, 2, 8, 0))]:
+            self.assertEqual(list(self.memo.expand(self.seeker, start, end, duration, until)),
+                             list(expand_rrule(self.seeker, start, end, duration, until)))
+
+    def test_months_are_reused(self):
+        start, end = datetime.datetime(2008, 3, 10), datetime.datetime(2008, 3, 20)
+        list(self.memo.expand(self.seeker, start, end, datetime.timedelta(hours=1)))
+        misses = self.memo.stats()['misses']
+        list(self.memo.expand(self.seeker, start + datetime.timedelta(days=3), end, datetime.timedelta(hours=1)))
+        self.assertEqual(self.memo.stats()['misses'], misses)
+
+    def test_memory_bound(self):
+        memo = ExpansionMemo(20)
+        list(memo.expand(self.seeker, datetime.datetime(2008, 1, 1), datetime.datetime(2009, 1, 1),
+                         datetime.timedelta(hours=1)))
+        self.assertTrue(memo.stats()['size'] <= 20)
+
+
+class TestCountBetween(TestCase):
+    def setUp(self):
+        self.calendar = Calendar.objects.create(name="MyCal")
+
+    def create_event(self, frequency, params=""):
+        rule = Rule(frequency=frequency, params=params)
+        rule.save()
+        return Event.objects.create(title='Recurring', start=datetime.datetime(2008, 1, 1, 8, 0),
+                                    end=datetime.datetime(2008, 1, 1, 9, 0), rule=rule,
+                                    end_recurring_period=datetime.datetime(2008, 6, 1),
+                                    calendar=self.calendar)
+
+    def assertCountsLike(self, event, start, end):
+        self.assertEqual(event.count_between(start, end), len(event.get_occurrences(start, end)))
+
+    def test_fixed_step_rule(self):
+        event = self.create_event("DAILY", "interval:3")
+        self.assertEqual(event.count_between(datetime.datetime(2008, 1, 1), datetime.datetime(2008, 1, 31)), 10)
+        self.assertCountsLike(event, datetime.datetime(2008, 5, 20), datetime.datetime(2008, 7, 1))
+
+    def test_other_rules(self):
+        event = self.create_event("MONTHLY", "bymonthday:1,15")
+        self.assertEqual(event.count_between(datetime.datetime(2008, 1, 1), datetime.datetime(2008, 3, 1)), 4)
+        self.assertCountsLike(event, datetime.datetime(2007, 12, 1), datetime.datetime(2009, 1, 1))
+
+    def test_persisted_occurrences(self):
+        event = self.create_event("WEEKLY")
+        start, end = datetime.datetime(2008, 1, 1), datetime.datetime(2008, 2, 1)
+        occurrences = event.get_occurrences(start, end)
+        occurrences[0].cancel()
+        moved = occurrences[1]
+        moved.move(moved.start + datetime.timedelta(days=60), moved.end + datetime.timedelta(days=60))
+        self.assertEqual(event.count_between(start, end), 3)
+        self.assertEqual(event.count_between(start, end, cancelled=True), 4)
+        self.assertEqual(event.count_between(datetime.datetime(2008, 3, 1), datetime.datetime(2008, 4, 1)), 5)
+
+
+class TestExpansionBudget(TestCase):
+    def setUp(self):
+        rule = Rule(frequency="MINUTELY")
+        rule.save()
+        self.event = Event(title='Every minute', start=datetime.datetime(2008, 1, 1, 8, 0),
+                           end=datetime.datetime(2008, 1, 1, 8, 1), rule=rule,
+                           calendar=Calendar.objects.create(name="MyCal"))
+        self.event.save()
+
+    def test_event_limit(self):
+        budget = ExpansionBudget(per_event=100, total=None)
+        exceeded = ExpansionBudget.exceeded
+        occurrences = self.event.get_occurrences(datetime.datetime(2008, 1, 1), datetime.datetime(2008, 1, 2),
+                                                 budget=budget)
+        self.assertEqual(len(occurrences), 100)
+        self.assertEqual(occurrences[-1].start, datetime.datetime(2008, 1, 1, 9, 39))
+        self.assertTrue(budget.truncated)
+        self.assertEqual(ExpansionBudget.exceeded, exceeded + 1)
+
+    def test_within_limits(self):
+        budget = ExpansionBudget(per_event=60, total=60)
+        occurrences = self.event.get_occurrences(datetime.datetime(2008, 1, 1, 8, 0),
+                                                 datetime.datetime(2008, 1, 1, 9, 0), budget=budget)
+        self.assertEqual(len(occurrences), 60)
+        self.assertFalse(budget.truncated)
+
+
+@skipUnless(numpy, "NumPy is not installed")
+class TestVectorizedExpansion(TestCase):
+    def assertExpandsLikeRRule(self, frequency, params, dtstart=datetime.datetime(2008, 1, 31, 8, 0)):
+        seeker = RuleSeeker(frequency, params, dtstart)
+        self.assertTrue(seeker.vectorizable)
+        duration = datetime.timedelta(hours=30)
+        windows = [
+            (datetime.datetime(2007, 12, 1), datetime.datetime(2008, 3, 1), None),
+            (datetime.datetime(2009, 2, 10, 12, 0), datetime.datetime(2009, 2, 11), None),
+            (datetime.datetime(2008, 6, 1), datetime.datetime(2011, 6, 1),
+             datetime.datetime(2010, 3, 31, 8, 0)),
+        ]
+        for start, end, until in windows:
+            vectorized = list(expand_rrule(seeker, start, end, duration, until))
+            seeker.vectorizable = False
+            self.assertEqual(vectorized, list(expand_rrule(seeker, start, end, duration, until)))
+            seeker.vectorizable = True
+
+    def test_daily(self):
+        self.assertExpandsLikeRRule("DAILY", {})
+        self.assertExpandsLikeRRule("DAILY", {'interval': 3, 'byweekday': [0, 4]})
+        self.assertExpandsLikeRRule("DAILY", {'interval': 7, 'byweekday': 2, 'count': 10})
+
+    def test_weekly(self):
+        self.assertExpandsLikeRRule("WEEKLY", {'interval': 2})
+        self.assertExpandsLikeRRule("WEEKLY", {'byweekday': [0, 2, 4], 'count': 200})
+        self.assertExpandsLikeRRule("WEEKLY", {'interval': 3, 'byweekday': [1, 6]})
+
+    def test_monthly(self):
+        self.assertExpandsLikeRRule("MONTHLY", {})
+        self.assertExpandsLikeRRule("MONTHLY", {'interval': 5, 'count': 12})
+        self.assertExpandsLikeRRule("MONTHLY", {'interval': 2}, datetime.datetime(2008, 2, 29, 8, 0))
+
+    def test_daily_byweekday_arrays(self):
+        params = {'interval': 3, 'byweekday': [0, 4]}
+        dtstart = datetime.datetime(2008, 1, 31, 8, 0)
+        start, end = datetime.datetime(2008, 1, 1), datetime.datetime(2008, 6, 1)
+        starts, ends = expand_datetime64("DAILY", params, dtstart, start, end, datetime.timedelta(hours=1))
+        expected = compile_rrule("DAILY", params, dtstart).between(
+            start - datetime.timedelta(hours=1), end, inc=True)
+        self.assertEqual(list(starts.astype(object)), expected)
+        self.assertEqual(list((ends - starts).astype(object)), [datetime.timedelta(hours=1)] * len(expected))
+
+    def test_complex_rules_use_dateutil(self):
+        self.assertFalse(RuleSeeker("MONTHLY", {'byweekday': [0]}, datetime.datetime(2008, 1, 5)).vectorizable)
+        self.assertFalse(RuleSeeker("WEEKLY", {'byhour': [8, 12]}, datetime.datetime(2008, 1, 5)).vectorizable)
+        self.assertFalse(RuleSeeker("YEARLY", {}, datetime.datetime(2008, 1, 5)).vectorizable)
+
+
+class TestOccurrenceIndex(TestCase):
+    def setUp(self):
+        rule = Rule(frequency="DAILY")
+        rule.save()
+        cal = Calendar(name="MyCal")
+        cal.save()
+        start = timezone.now().replace(hour=8, minute=0, second=0, microsecond=0)
+        self.event = Event(**{
+                'title': 'Daily Event',
+                'start': start - datetime.timedelta(days=10),
+                'end': start - datetime.timedelta(days=10) + datetime.timedelta(hours=1),
+                'rule': rule,
+                'calendar': cal
+               })
+        self.event.save()
+        self.start = start - datetime.timedelta(days=3)
+        self.end = start + datetime.timedelta(days=3)
+
+    def test_index_matches_expansion(self):
+        OccurrenceIndex.objects.index_event(self.event)
+        self.assertTrue(OccurrenceIndex.objects.covers(self.start, self.end))
+        indexed = OccurrenceIndex.objects.get_occurrences(Event.objects.all(), self.start, self.end)
+        expanded = self.event.get_occurrences(self.start, self.end)
+        self.assertEqual([(o.start, o.end) for o in indexed],
+                         [(o.start, o.end) for o in expanded])
+
+    def test_index_follows_persisted_occurrences(self):
+        OccurrenceIndex.objects.index_event(self.event)
+        occurrence = self.event.get_occurrences(self.start, self.end)[1]
+        occurrence = occurrence.move(occurrence.start + datetime.timedelta(hours=2),
+                                     occurrence.end + datetime.timedelta(hours=2))
+        OccurrenceIndex.objects.index_occurrence(occurrence)
+        indexed = OccurrenceIndex.objects.get_occurrences(Event.objects.all(), self.start, self.end)
+        self.assertEqual(indexed[1].pk, occurrence.pk)
+        OccurrenceIndex.objects.unindex_occurrence(occurrence)
+        occurrence.delete()
+        indexed = OccurrenceIndex.objects.get_occurrences(Event.objects.all(), self.start, self.end)
+        self.assertEqual(indexed[1].start, occurrence.original_start)
+
+    def test_index_occurrence_view(self):
+        OccurrenceIndex.objects.index_event(self.event)
+        view = self.event.get_occurrences(self.start, self.end)[1]
+        occurrence = view.move(view.start + datetime.timedelta(hours=2), view.end + datetime.timedelta(hours=2))
+        OccurrenceIndex.objects.index_occurrence(view)
+        row = OccurrenceIndex.objects.get(occurrence=occurrence)
+        self.assertEqual((row.start, row.original_start), (occurrence.start, view.start))
+
+    def test_unindex_occurrence_outside_rule(self):
+        OccurrenceIndex.objects.index_event(self.event)
+        occurrence = self.event.get_occurrences(self.start, self.end)[1]
+        occurrence.move(occurrence.start + datetime.timedelta(hours=2),
+                        occurrence.end + datetime.timedelta(hours=2))
+        # the rule no longer generates the original start of the occurrence
+        Event.objects.filter(pk=self.event.pk).update(start=self.event.start + datetime.timedelta(hours=1),
+                                                      end=self.event.end + datetime.timedelta(hours=1))
+        event = Event.objects.get(pk=self.event.pk)
+        occurrence = Occurrence.objects.get(pk=occurrence.pk)
+        OccurrenceIndex.objects.unindex_occurrence(occurrence)
+        self.assertFalse(OccurrenceIndex.objects.filter(
+            event=event, original_start=occurrence.original_start).exists())
+
+    def test_index_ignores_expansion_budget(self):
+        rule = Rule(frequency="MINUTELY", params="count:%d" % (ExpansionBudget().per_event + 1))
+        rule.save()
+        event = Event.objects.create(title='Minutely', calendar=self.event.calendar, rule=rule,
+                                     start=self.start, end=self.start + datetime.timedelta(seconds=30))
+        OccurrenceIndex.objects.index_event(event)
+        self.assertEqual(OccurrenceIndex.objects.filter(event=event).count(), ExpansionBudget().per_event + 1)
+
+
+class TestNextOccurrence(TestCase):
+    def setUp(self):
+        self.rule = Rule(frequency="DAILY")
+        self.rule.save()
+        self.cal = Calendar.objects.create(name="MyCal")
+        self.now = timezone.now().replace(hour=8, minute=0, second=0, microsecond=0)
+
+    def create_event(self, title, start, rule=None, end_recurring_period=None):
+        return Event.objects.create(title=title, calendar=self.cal, start=start,
+                                    end=start + datetime.timedelta(hours=1), rule=rule,
+                                    end_recurring_period=end_recurring_period)
+
+    def test_maintained_on_save(self):
+        event = self.create_event('Daily', self.now - datetime.timedelta(days=10), self.rule)
+        self.assertEqual(event.next_occurrence_start, event.get_next_occurrence_span()[0])
+        self.assertTrue(event.next_occurrence_end > timezone.now() - NEXT_OCCURRENCE_MARGIN)
+        self.assertTrue(event.next_occurrence_start <= self.now)
+        over = self.create_event('Over', self.now - datetime.timedelta(days=10), self.rule,
+                                 self.now - datetime.timedelta(days=5))
+        self.assertEqual(over.next_occurrence_start, None)
+        self.assertEqual(list(Event.objects.upcoming()), [event])
+
+    def test_advance_command(self):
+        event = self.create_event('Daily', self.now - datetime.timedelta(days=10), self.rule)
+        stale = self.now - datetime.timedelta(days=9)
+        Event.objects.filter(pk=event.pk).update(next_occurrence_start=stale,
+                                                 next_occurrence_end=stale + datetime.timedelta(hours=1))
+        call_command('advance_next_occurrences')
+        self.assertEqual(Event.objects.get(pk=event.pk).next_occurrence_start, event.next_occurrence_start)
+
+    def test_occurrences_after(self):
+        self.create_event('Daily', self.now - datetime.timedelta(days=10), self.rule)
+        self.create_event('Weekly', self.now + datetime.timedelta(days=2, hours=1),
+                          Rule.objects.create(frequency="WEEKLY"))
+        self.create_event('Once', self.now + datetime.timedelta(days=1, minutes=30))
+        self.create_event('Past', self.now - datetime.timedelta(days=3))
+        after = timezone.now()
+        upcoming = list(islice(self.cal.occurrences_after(after), 12))
+        expected = list(islice(EventListManager(list(Event.objects.all())).occurrences_after(after), 12))
+        self.assertEqual([(o.event.title, o.start) for o in upcoming],
+                         [(o.event.title, o.start) for o in expected])
+        self.assertTrue('Once' in [o.event.title for o in upcoming])
+
+    def test_occurrences_after_moved_occurrences(self):
+        weekly = self.create_event('Weekly', self.now + datetime.timedelta(days=2),
+                                   Rule.objects.create(frequency="WEEKLY"))
+        past = self.create_event('Past', self.now - datetime.timedelta(days=3))
+        self.create_event('Once', self.now + datetime.timedelta(days=1))
+        earlier = weekly.get_occurrence(self.now + datetime.timedelta(days=9))
+        earlier.move(self.now + datetime.timedelta(hours=1), self.now + datetime.timedelta(hours=2))
+        later = past.get_occurrence(past.start)
+        later.move(self.now + datetime.timedelta(days=1, hours=1), self.now + datetime.timedelta(days=1, hours=2))
+        upcoming = list(islice(self.cal.occurrences_after(timezone.now()), 4))
+        self.assertEqual([(o.event.title, o.start) for o in upcoming],
+                         [('Weekly', earlier.start),
+                          ('Once', self.now + datetime.timedelta(days=1)),
+                          ('Past', later.start),
+                          ('Weekly', weekly.start)])
+
+
+class TestPossiblyOverlapping(TestCase):
+    def setUp(self):
+        rule = Rule(frequency="WEEKLY")
+        rule.save()
+        cal = Calendar(name="MyCal")
+        cal.save()
+        self.one_off = Event.objects.create(
+            title='One Off', calendar=cal,
+            start=datetime.datetime(2007, 1, 5, 8, 0),
+            end=datetime.datetime(2007, 1, 5, 9, 0))
+        self.bounded = Event.objects.create(
+            title='Bounded', calendar=cal, rule=rule,
+            start=datetime.datetime(2008, 1, 5, 8, 0),
+            end=datetime.datetime(2008, 1, 5, 9, 0),
+            end_recurring_period=datetime.datetime(2008, 5, 5, 0, 0))
+        self.forever = Event.objects.create(
+            title='Forever', calendar=cal, rule=rule,
+            start=datetime.datetime(2008, 1, 5, 8, 0),
+            end=datetime.datetime(2008, 1, 5, 9, 0))
+
+    def test_series_span(self):
+        self.assertEqual(self.bounded.first_occurrence_start, datetime.datetime(2008, 1, 5, 8, 0))
+        self.assertEqual(self.bounded.last_occurrence_end, datetime.datetime(2008, 5, 3, 9, 0))
+        self.assertEqual(self.forever.last_occurrence_end, None)
+
+    def test_fixed_step_series_span(self):
+        rule = Rule.objects.create(frequency="MINUTELY", params="interval:7")
+        event = Event.objects.create(
+            title='Minutely', calendar=self.bounded.calendar, rule=rule,
+            start=datetime.datetime(2008, 1, 5, 8, 0),
+            end=datetime.datetime(2008, 1, 5, 8, 5),
+            end_recurring_period=datetime.datetime(2018, 1, 5, 0, 0))
+        self.assertEqual(event.last_occurrence_end, datetime.datetime(2018, 1, 5, 0, 0))
+
+    def test_possibly_overlapping(self):
+        events = Event.objects.possibly_overlapping(datetime.datetime(2009, 1, 1),
+                                                    datetime.datetime(2009, 2, 1))
+        self.assertEqual(list(events), [self.forever])
+        events = Event.objects.possibly_overlapping(datetime.datetime(2007, 1, 5, 8, 30),
+                                                    datetime.datetime(2008, 1, 5, 8, 30))
+        self.assertEqual(set(events), set([self.one_off, self.bounded, self.forever]))
+
+    def test_moved_occurrence_extends_span(self):
+        occurrence = self.bounded.get_occurrences(datetime.datetime(2008, 5, 3),
+                                                  datetime.datetime(2008, 5, 4))[0]
+        occurrence.move(datetime.datetime(2008, 6, 1, 8, 0), datetime.datetime(2008, 6, 1, 9, 0))
+        events = Event.objects.possibly_overlapping(datetime.datetime(2008, 6, 1),
+                                                    datetime.datetime(2008, 6, 2))
+        self.assertTrue(self.bounded in events)
+
+
+@skipUnless(connection.vendor == 'sqlite', "Query plans are checked on SQLite")
+class TestQueryPlans(TestCase):
+    def get_plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        cursor = connection.cursor()
+        cursor.execute('EXPLAIN QUERY PLAN %s' % sql, params)
+        return ' '.join(str(row[-1]) for row in cursor.fetchall())
+
+    def assertUsesIndex(self, queryset, *columns):
+        plan = self.get_plan(queryset)
+        self.assertTrue('USING INDEX' in plan or 'USING COVERING INDEX' in plan, plan)
+        for column in columns:
+            self.assertTrue(column in plan, plan)
+
+    def test_occurrence_by_original_start(self):
+        self.assertUsesIndex(
+            Occurrence.objects.filter(event_id=1, original_start=datetime.datetime(2008, 1, 5, 8, 0)),
+            'event_id=?', 'original_start=?')
+
+    def test_event_by_calendar_and_start(self):
+        self.assertUsesIndex(
+            Event.objects.filter(calendar_id=1, start__gte=datetime.datetime(2008, 1, 1)),
+            'calendar_id=?', 'start>')
+
+    def test_relations_by_object(self):
+        for model in (EventRelation, CalendarRelation):
+            self.assertUsesIndex(
+                model.objects.filter(content_type_id=1, object_id=1, distinction='owner'),
+                'content_type_id=?', 'object_id=?', 'distinction=?')
@@ -1,8 +1,11 @@
 from django.test import TestCase
 from events.conf.settings import FIRST_DAY_OF_WEEK
-from events.models import Event, Rule, Calendar
-from events.periods import Period, Month, Day, Year
+from events.settings import EXPANSION_BUDGET_PER_EVENT
+from events.models import Event, Rule, Calendar, Occurrence
+from events.periods import ExpansionContext, IntervalIndex, Period, Month, Day, Year
+from events.ranges import YearRange, MonthRange, WeekRange, DayRange, localize_to_utc
 import datetime
+import pytz
 
 
 class TestPeriod(TestCase):
@@ -26,6 +29,63 @@ class TestPeriod(TestCase):
                             start=datetime.datetime(2008, 1, 4, 7, 0),
                             end=datetime.datetime(2008, 1, 21, 7, 0))
 
+    def test_has_occurrences_streams(self):
+        self.assertTrue(self.period.has_occurrences())
+        self.assertFalse(hasattr(self.period, '_occurrences'))
+        self.assertEqual(list(self.period.iter_occurrences()), self.period.occurrences)
+
+    def test_count_occurrences(self):
+        self.assertEqual(self.period.count_occurrences(), 3)
+        self.assertFalse(hasattr(self.period, '_occurrences'))
+        occurrence = self.period.occurrences[0]
+        occurrence.cancel()
+        period = Period(Event.objects.all(), self.period.start, self.period.end)
+        self.assertEqual(period.count_occurrences(), 2)
+        self.assertEqual(period.count_occurrences(), len(period.get_occurrence_partials()))
+
+    def test_busy_days(self):
+        month = Month(Event.objects.all(), datetime.datetime(2008, 1, 1))
+        self.assertEqual(len(month.busy_days()), 4)
+        busy = [day.date for week in month.get_weeks() for day in week.get_days()
+                if day.start.month == 1 and day.has_occurrences()]
+        self.assertEqual([datetime.date(2008, 1, d) for d in (5, 12, 19, 26)], busy)
+        self.assertEqual([date for date in busy if month.is_busy_day(date)], busy)
+        self.assertFalse(month.is_busy_day(datetime.date(2008, 1, 6)))
+        self.assertFalse(month.is_busy_day(datetime.date(2008, 2, 2)))
+
+    def test_busy_months(self):
+        year = Year(Event.objects.all(), datetime.datetime(2008, 1, 1))
+        self.assertEqual(len(year.busy_days()), 46)
+        months = list(year.get_busy_months())
+        self.assertEqual(len(months), 12)
+        self.assertFalse(hasattr(year, '_occurrences'))
+        for month in months:
+            fresh = Month(Event.objects.all(), month.start)
+            self.assertEqual(month.busy_days(), fresh.busy_days())
+
+    def test_unexpanded_context_counts(self):
+        month = Month(Event.objects.all(), datetime.datetime(2008, 1, 1))
+        context = ExpansionContext.share([month], adjacent=1)
+        self.assertEqual(len(month.busy_days()), 4)
+        self.assertTrue(month.has_occurrences())
+        self.assertEqual(month.count_occurrences(), 4)
+        self.assertFalse(context.expanded)
+        self.assertEqual(len(month.occurrences), 4)
+        self.assertTrue(context.expanded)
+        self.assertEqual(month.next().count_occurrences(), 4)
+
+    def test_truncated(self):
+        self.assertFalse(self.period.truncated)
+        rule = Rule(frequency="SECONDLY")
+        rule.save()
+        Event.objects.create(title='Every second', start=datetime.datetime(2008, 1, 5, 0, 0),
+                             end=datetime.datetime(2008, 1, 5, 0, 0, 1), rule=rule,
+                             calendar=Calendar.objects.get(name="MyCal"))
+        day = Day(Event.objects.all(), datetime.datetime(2008, 1, 5))
+        self.assertEqual(len(day.occurrences), EXPANSION_BUDGET_PER_EVENT + 1)
+        self.assertTrue(day.truncated)
+        self.assertTrue(day.get_time_slot(day.start, day.end).truncated)
+
     def test_get_occurrences(self):
         occurrence_list = self.period.occurrences
         self.assertEqual(["%s to %s" % (o.start, o.end) for o in occurrence_list],
@@ -169,6 +229,32 @@ class TestMonth(TestCase):
         for actual, expected in zip(actuals, expecteds):
             self.assertEqual(actual, expected)
 
+    def test_sub_periods_share_interval_index(self):
+        index = self.month.get_interval_index()
+        for week in self.month.get_weeks():
+            for day in week.get_days():
+                self.assertEqual(day.occurrences,
+                    [o for o in week.occurrences if o.start < day.utc_end and o.end > day.utc_start])
+                self.assertTrue(day.get_interval_index().occurrences is index.occurrences)
+
+    def test_days_read_partials_from_month_buckets(self):
+        for week in self.month.get_weeks():
+            for day in week.get_days():
+                partials = day.get_occurrence_partials()
+                self.assertTrue(day._partials is partials)
+                self.assertEqual(partials, Period.get_occurrence_partials(day))
+                self.assertEqual(day.has_occurrences(), bool(partials))
+
+    def test_adjacent_months_share_expansion(self):
+        context = ExpansionContext.share([self.month], adjacent=1)
+        for shared, fresh in [(self.month.prev(), Month(Event.objects.all(), datetime.datetime(2008, 1, 7))),
+                              (self.month, Month(Event.objects.all(), datetime.datetime(2008, 2, 7))),
+                              (self.month.next(), Month(Event.objects.all(), datetime.datetime(2008, 3, 7)))]:
+            self.assertTrue(shared.context is context)
+            self.assertEqual(shared.occurrences, fresh.occurrences)
+        self.assertEqual(self.month.next().next().context, context)
+        self.assertFalse(context.covers(self.month.next().next().utc_start, self.month.next().next().utc_end))
+
     def test_month_convenience_functions(self):
         self.assertEqual(self.month.prev_month().start, datetime.datetime(2008, 1, 1, 0, 0))
         self.assertEqual(self.month.next_month().start, datetime.datetime(2008, 3, 1, 0, 0))
@@ -198,6 +284,71 @@ class TestDay(TestCase):
         self.assertEqual(period.end, slot_end)
 
 
+class TestPeriodRange(TestCase):
+
+    def test_navigation(self):
+        month = MonthRange(datetime.datetime(2008, 12, 15))
+        self.assertEqual((month.start, month.end),
+                         (datetime.datetime(2008, 12, 1), datetime.datetime(2009, 1, 1)))
+        self.assertEqual(month.next(), MonthRange(datetime.datetime(2009, 1, 1)))
+        self.assertEqual(month.prev().prev(), MonthRange(datetime.datetime(2008, 10, 31)))
+        self.assertEqual(YearRange(datetime.datetime(2008, 4, 1)).prev().start, datetime.datetime(2007, 1, 1))
+        self.assertEqual(DayRange(datetime.date(2008, 2, 29)).next().date, datetime.date(2008, 3, 1))
+        week = WeekRange(datetime.datetime(2008, 2, 7))
+        self.assertEqual(week.next().start - week.start, datetime.timedelta(days=7))
+        self.assertEqual(week.start.isoweekday() % 7, FIRST_DAY_OF_WEEK)
+
+    def test_time_zone(self):
+        amsterdam = pytz.timezone('Europe/Amsterdam')
+        day = DayRange(datetime.date(2008, 3, 30), amsterdam)
+        self.assertEqual(day.utc_start, datetime.datetime(2008, 3, 29, 23, 0, tzinfo=pytz.utc))
+        self.assertEqual(day.utc_end, datetime.datetime(2008, 3, 30, 22, 0, tzinfo=pytz.utc))
+        self.assertEqual(day.next().start, amsterdam.localize(datetime.datetime(2008, 3, 31)))
+
+    def test_localize_to_utc(self):
+        for zone in ['Europe/Amsterdam', 'America/Sao_Paulo', 'UTC']:
+            tzinfo = pytz.timezone(zone)
+            for day in range(366):
+                naive = datetime.datetime(2008, 1, 1) + datetime.timedelta(days=day)
+                self.assertEqual(localize_to_utc(naive, tzinfo), tzinfo.localize(naive).astimezone(pytz.utc))
+            naive = datetime.datetime(2008, 3, 30, 2, 30)
+            self.assertEqual(localize_to_utc(naive, tzinfo), tzinfo.localize(naive).astimezone(pytz.utc))
+
+    def test_period_bounds_are_converted_once(self):
+        day = Day([], datetime.datetime(2008, 2, 7), tzinfo=pytz.timezone('Europe/Amsterdam'))
+        self.assertTrue(day.start is day.start)
+        day.utc_start = day.utc_start - datetime.timedelta(days=1)
+        self.assertEqual(day.start, day.utc_start.astimezone(day.tzinfo))
+
+    def test_periods_use_ranges(self):
+        month = Month([], datetime.datetime(2008, 2, 7))
+        self.assertEqual(month.range, MonthRange(datetime.datetime(2008, 2, 1), month.tzinfo))
+        self.assertEqual(month.next().range, month.range.next())
+        year = Year([], datetime.datetime(2008, 2, 7), tzinfo=pytz.timezone('Europe/Amsterdam'))
+        self.assertEqual(year.next().tzinfo, year.tzinfo)
+        self.assertEqual('%s' % year, '2008')
+
+
+class TestIntervalIndex(TestCase):
+
+    def setUp(self):
+        self.occurrences = [Occurrence(start=datetime.datetime(2008, 1, day, 8, 0),
+                                       end=datetime.datetime(2008, 1, day + length, 9, 0))
+                            for day, length in [(1, 10), (3, 0), (5, 1), (12, 0)]]
+        self.index = IntervalIndex(self.occurrences)
+
+    def test_overlapping(self):
+        self.assertEqual(self.index.overlapping(datetime.datetime(2008, 1, 6), datetime.datetime(2008, 1, 12)),
+                         [self.occurrences[0], self.occurrences[2]])
+        self.assertEqual(self.index.overlapping(datetime.datetime(2008, 1, 11, 9, 0), datetime.datetime(2008, 1, 13)),
+                         [self.occurrences[3]])
+
+    def test_restrict(self):
+        restricted = self.index.restrict(datetime.datetime(2008, 1, 1), datetime.datetime(2008, 1, 4))
+        self.assertEqual(restricted.overlapping(datetime.datetime(2008, 1, 2), datetime.datetime(2008, 1, 8)),
+                         [self.occurrences[0], self.occurrences[1]])
+
+
 class TestOccurrencePool(TestCase):
 
     def setUp(self):
@@ -226,3 +377,35 @@ class TestOccurrencePool(TestCase):
         parent_period = Period(Event.objects.all(), start, end)
         period = Period(parent_period.events, start, end, parent_period.get_persisted_occurrences(), parent_period.occurrences)
         self.assertEquals(parent_period.occurrences, period.occurrences)
+
+
+class TestPersistedOccurrencePrefetch(TestCase):
+
+    def setUp(self):
+        rule = Rule(frequency="WEEKLY")
+        rule.save()
+        cal = Calendar(name="MyCal")
+        cal.save()
+        data = {
+                'title': 'Recent Event',
+                'start': datetime.datetime(2008, 1, 5, 8, 0),
+                'end': datetime.datetime(2008, 1, 5, 9, 0),
+                'end_recurring_period': datetime.datetime(2008, 5, 5, 0, 0),
+                'rule': rule,
+                'calendar': cal
+               }
+        self.recurring_event = Event(**data)
+        self.recurring_event.save()
+        self.far_away = self.recurring_event.get_occurrences(datetime.datetime(2008, 4, 26),
+                                                             datetime.datetime(2008, 4, 27))[0]
+        self.far_away.cancel()
+        self.moved_in = self.recurring_event.get_occurrences(datetime.datetime(2008, 1, 26),
+                                                             datetime.datetime(2008, 1, 27))[0]
+        self.moved_in.move(datetime.datetime(2008, 1, 12, 10, 0), datetime.datetime(2008, 1, 12, 11, 0))
+
+    def test_only_window_is_prefetched(self):
+        day = Day(Event.objects.all(), datetime.datetime(2008, 1, 12))
+        self.assertEqual([(o.start, o.pk) for o in day.occurrences],
+                         [(datetime.datetime(2008, 1, 12, 8, 0), None),
+                          (datetime.datetime(2008, 1, 12, 10, 0), self.moved_in.pk)])
+        self.assertEqual([list(event.occurrence_set.all()) for event in day.events], [[self.moved_in]])
@@ -0,0 +1,92 @@
+import datetime
+from unittest import skipUnless
+from django.db import connection
+from django.test import TestCase
+from events.models import Event, Rule, Calendar
+from events.sql import DIALECTS, SQLExpansion, rule_step
+from events.utils import EventListManager
+
+
+@skipUnless(connection.vendor in DIALECTS, "SQL expansion needs SQLite or PostgreSQL")
+class TestSQLExpansion(TestCase):
+    def setUp(self):
+        cal = Calendar(name="MyCal")
+        cal.save()
+        self.daily = Rule(frequency="DAILY", params="interval:2")
+        self.daily.save()
+        weekly = Rule(frequency="WEEKLY", params="count:5")
+        weekly.save()
+        self.monthly = Rule(frequency="MONTHLY")
+        self.monthly.save()
+        self.every_other_day = Event.objects.create(
+            title='Every other day', calendar=cal, rule=self.daily,
+            start=datetime.datetime(2008, 1, 1, 8, 0),
+            end=datetime.datetime(2008, 1, 1, 9, 0),
+            end_recurring_period=datetime.datetime(2008, 3, 1, 0, 0))
+        Event.objects.create(
+            title='Five weeks', calendar=cal, rule=weekly,
+            start=datetime.datetime(2008, 1, 28, 12, 0),
+            end=datetime.datetime(2008, 1, 29, 13, 0))
+        self.monthly_event = Event.objects.create(
+            title='Monthly', calendar=cal, rule=self.monthly,
+            start=datetime.datetime(2007, 12, 15, 10, 0),
+            end=datetime.datetime(2007, 12, 15, 11, 0))
+        Event.objects.create(
+            title='Once', calendar=cal,
+            start=datetime.datetime(2008, 2, 10, 10, 0),
+            end=datetime.datetime(2008, 2, 10, 11, 0))
+        self.start = datetime.datetime(2008, 2, 1, 0, 0)
+        self.end = datetime.datetime(2008, 3, 15, 0, 0)
+
+    def assertSameOccurrences(self, events):
+        expected = EventListManager(events).occurrences_between(self.start, self.end)
+        occurrences = SQLExpansion(events, self.start, self.end).get_occurrences()
+        self.assertEqual(
+            [(o.event_id, o.start, o.end, o.pk, o.cancelled) for o in occurrences],
+            [(o.event_id, o.start, o.end, o.pk, o.cancelled) for o in expected])
+
+    def test_rule_step(self):
+        self.assertEqual(rule_step(self.daily), (2 * 86400, None))
+        self.assertEqual(rule_step(self.monthly), None)
+        self.assertEqual(rule_step(Rule(frequency="WEEKLY", params="byweekday:1,3")), None)
+
+    def test_python_events(self):
+        expansion = SQLExpansion(Event.objects.all(), self.start, self.end)
+        self.assertEqual(list(expansion.get_python_events()), [self.monthly_event])
+
+    def test_occurrences(self):
+        self.assertSameOccurrences(Event.objects.all())
+        self.assertSameOccurrences(Event.objects.filter(title='Five weeks'))
+
+    def test_persisted_occurrences(self):
+        occurrences = self.every_other_day.get_occurrences(self.start, self.end)
+        occurrences[0].move(occurrences[0].start + datetime.timedelta(hours=2),
+                            occurrences[0].end + datetime.timedelta(hours=2))
+        occurrences[1].cancel()
+        occurrences[2].move(datetime.datetime(2008, 6, 1, 8, 0), datetime.datetime(2008, 6, 1, 9, 0))
+        self.assertSameOccurrences(Event.objects.all())
+
+    def test_cancelled_occurrences_moved_in(self):
+        # a cancelled occurrence moved into the range from outside of it is
+        # left out, a cancelled one replacing an occurrence of the range is not
+        before = self.every_other_day.get_occurrences(datetime.datetime(2008, 1, 1), datetime.datetime(2008, 1, 2))
+        before[0].move(datetime.datetime(2008, 2, 3, 12, 0), datetime.datetime(2008, 2, 3, 13, 0))
+        before[0].cancel()
+        self.every_other_day.get_occurrences(self.start, self.end)[0].cancel()
+        self.assertSameOccurrences(Event.objects.all())
+
+    def test_sub_second_times(self):
+        Event.objects.create(
+            title='All day', calendar=self.every_other_day.calendar, rule=self.daily, all_day=True,
+            start=datetime.datetime(2008, 2, 2), end=datetime.datetime(2008, 2, 2))
+        occurrences = SQLExpansion(Event.objects.filter(title='All day'), self.start, self.end).get_occurrences()
+        self.assertEqual(occurrences[0].end, datetime.datetime(2008, 2, 2, 23, 59, 59, 999999))
+        self.assertSameOccurrences(Event.objects.all())
+
+    def test_count(self):
+        occurrences = self.every_other_day.get_occurrences(self.start, self.end)
+        occurrences[1].cancel()
+        expansion = SQLExpansion(Event.objects.all(), self.start, self.end)
+        expected = EventListManager(Event.objects.all()).occurrences_between(self.start, self.end)
+        self.assertEqual(expansion.count(cancelled=True), len(expected))
+        self.assertEqual(expansion.count(), len([o for o in expected if not o.cancelled]))
@@ -2,7 +2,7 @@ from django.test import TestCase
 from django.template import Template, RequestContext
 from events.models import Event, Calendar
 from events.templatetags.events import querystring_for_date
-from events.periods import Day
+from events.periods import Day, Month
 import datetime
 
 
@@ -34,3 +34,15 @@ class TestTemplateTags(TestCase):
         c = RequestContext(request, {'day': day})
         out = Template('{% load events %}{% all_day_events_list day %}').render(c)
         self.assertTrue('Test All Day Event' in out)
+
+    def test_small_month_table(self):
+        request = self.client.get("/").context['request']
+        cal = Calendar.objects.create(name="Small", slug="small")
+        Event.objects.create(start=datetime.datetime(2008, 1, 9, 8, 0), end=datetime.datetime(2008, 1, 9, 9, 0),
+                             title="Busy", calendar=cal)
+        month = Month(Event.objects.filter(calendar=cal), datetime.datetime(2008, 1, 1))
+        c = RequestContext(request, {'calendar': cal, 'month': month})
+        out = Template('{% load events %}{% month_table calendar month "small" %}').render(c)
+        self.assertEqual(out.count('daynumber busy'), 1)
+        self.assertEqual(out.count('daynumber free'), 30)
+        self.assertFalse(hasattr(month, '_occurrences'))
@@ -1,7 +1,8 @@
 import datetime
+import itertools
 from django.test import TestCase
 from events.models import Event, Rule, Calendar
-from events.utils import EventListManager
+from events.utils import EventListManager, OccurrenceReplacer, iter_occurrences
 
 
 class TestEventListManager(TestCase):
@@ -44,3 +45,109 @@ class TestEventListManager(TestCase):
         self.assertEqual(occurrences.next().event, self.event2)
         self.assertEqual(occurrences.next().event, self.event2)
         self.assertEqual(occurrences.next().event, self.event1)
+
+    def test_occurrences_after_queryset(self):
+        future = Event.objects.create(title='Future Event', start=datetime.datetime(2009, 4, 3, 7, 0),
+                                      end=datetime.datetime(2009, 4, 3, 8, 0), calendar=self.event1.calendar)
+        moved = self.event2.get_occurrence(datetime.datetime(2009, 4, 2, 9, 0))
+        moved.move(datetime.datetime(2009, 4, 2, 10, 0), datetime.datetime(2009, 4, 2, 11, 0))
+        eml = EventListManager(Event.objects.all())
+        occurrences = list(itertools.islice(eml.occurrences_after(datetime.datetime(2009, 4, 1, 0, 0)), 5))
+        self.assertEqual([(o.event, o.start) for o in occurrences],
+            [(self.event1, datetime.datetime(2009, 4, 1, 8, 0)),
+             (self.event2, datetime.datetime(2009, 4, 1, 9, 0)),
+             (self.event2, datetime.datetime(2009, 4, 2, 10, 0)),
+             (future, datetime.datetime(2009, 4, 3, 7, 0)),
+             (self.event2, datetime.datetime(2009, 4, 3, 9, 0))])
+
+    def test_occurrences_between(self):
+        event3 = Event(**{
+                'title': 'Later Daily Event',
+                'start': datetime.datetime(2009, 4, 2, 9, 0),
+                'end': datetime.datetime(2009, 4, 2, 10, 0),
+                'rule': self.event2.rule,
+                'calendar': self.event2.calendar
+               })
+        event3.save()
+        eml = EventListManager(Event.objects.all())
+        occurrences = eml.occurrences_between(datetime.datetime(2009, 4, 1, 0, 0),
+                                              datetime.datetime(2009, 4, 3, 0, 0))
+        self.assertEqual([(o.event, o.start) for o in occurrences],
+            [(self.event1, datetime.datetime(2009, 4, 1, 8, 0)),
+             (self.event2, datetime.datetime(2009, 4, 1, 9, 0)),
+             (self.event2, datetime.datetime(2009, 4, 2, 9, 0)),
+             (event3, datetime.datetime(2009, 4, 2, 9, 0))])
+
+    def test_iter_occurrences_order(self):
+        long_event = Event(**{
+                'title': 'Long Event',
+                'start': datetime.datetime(2009, 4, 1, 7, 0),
+                'end': datetime.datetime(2009, 4, 1, 12, 0),
+                'calendar': self.event1.calendar
+               })
+        long_event.save()
+        occurrences = list(iter_occurrences(Event.objects.all(), datetime.datetime(2009, 4, 1, 0, 0),
+                                            datetime.datetime(2009, 4, 2, 0, 0)))
+        self.assertEqual([(o.event, o.start) for o in occurrences],
+            [(long_event, datetime.datetime(2009, 4, 1, 7, 0)),
+             (self.event1, datetime.datetime(2009, 4, 1, 8, 0)),
+             (self.event2, datetime.datetime(2009, 4, 1, 9, 0))])
+        self.assertEqual(sorted(reversed(occurrences)), occurrences)
+
+
+    def test_iter_occurrences_loads_persisted_once(self):
+        moved = self.event2.get_occurrence(datetime.datetime(2009, 4, 2, 9, 0))
+        moved.move(datetime.datetime(2009, 4, 2, 10, 0), datetime.datetime(2009, 4, 2, 11, 0))
+        events = list(Event.objects.select_related('rule'))
+        with self.assertNumQueries(1):
+            occurrences = list(iter_occurrences(events, datetime.datetime(2009, 4, 1, 0, 0),
+                                                datetime.datetime(2009, 4, 3, 0, 0)))
+        self.assertEqual([(o.event, o.start, o.pk) for o in occurrences],
+            [(self.event1, datetime.datetime(2009, 4, 1, 8, 0), None),
+             (self.event2, datetime.datetime(2009, 4, 1, 9, 0), None),
+             (self.event2, datetime.datetime(2009, 4, 2, 10, 0), moved.pk)])
+        self.assertTrue(any(event is occurrences[2].event for event in events))
+
+class TestOccurrenceReplacer(TestCase):
+    def setUp(self):
+        rule = Rule(frequency="WEEKLY")
+        rule.save()
+        self.event = Event.objects.create(title='Weekly Event', start=datetime.datetime(2009, 4, 1, 8, 0),
+                                          end=datetime.datetime(2009, 4, 1, 9, 0), rule=rule,
+                                          calendar=Calendar.objects.create(name="MyCal"))
+        occurrences = self.event.get_occurrences(datetime.datetime(2009, 4, 1), datetime.datetime(2009, 7, 1))
+        self.moved = occurrences[2]
+        self.moved.move(datetime.datetime(2009, 4, 2, 8, 0), datetime.datetime(2009, 4, 2, 9, 0))
+        self.far = occurrences[-1]
+        self.far.cancel()
+
+    def test_additional_occurrences(self):
+        replacer = OccurrenceReplacer(self.event.occurrence_set.all())
+        self.assertEqual([o.start for o in replacer.get_additional_occurrences(
+            datetime.datetime(2009, 4, 2), datetime.datetime(2009, 4, 3))],
+            [datetime.datetime(2009, 4, 2, 8, 0)])
+        self.assertEqual(replacer.get_additional_occurrences(
+            datetime.datetime(2009, 4, 3), datetime.datetime(2009, 7, 1)), [])
+
+    def test_chunks_are_loaded_forward(self):
+        chunks = []
+
+        def load_chunk(start, end):
+            chunks.append(start)
+            return self.event.occurrence_set.filter(original_start__gte=start, original_start__lt=end)
+
+        replacer = OccurrenceReplacer(load_chunk=load_chunk)
+        replaced = []
+        for occurrence in self.event._occurrences_after_generator(datetime.datetime(2009, 4, 1)):
+            replaced.append(replacer.get_occurrence(occurrence))
+            if occurrence.original_start == self.far.original_start:
+                break
+        self.assertEqual(replaced[2].pk, self.moved.pk)
+        self.assertEqual(replaced[-1].pk, self.far.pk)
+        self.assertEqual(chunks, [datetime.datetime(2009, 4, 1, 8, 0), datetime.datetime(2009, 4, 29, 8, 0),
+                                  datetime.datetime(2009, 5, 27, 8, 0), datetime.datetime(2009, 6, 24, 8, 0)])
+
+    def test_occurrences_after(self):
+        occurrences = list(itertools.islice(self.event.occurrences_after(datetime.datetime(2009, 4, 1)), 13))
+        self.assertEqual(occurrences[2].start, datetime.datetime(2009, 4, 2, 8, 0))
+        self.assertTrue(occurrences[-1].cancelled)
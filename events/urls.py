@@ -26,7 +26,8 @@ urlpatterns = [
     url(r'^calendar/tri_month/(?P<calendar_slug>[-\w]+)/$',
         calendar_by_periods, name="tri_month_calendar",
         kwargs={'periods': [Month],
-                'template_name': 'events/calendar_tri_month.html'}),
+                'template_name': 'events/calendar_tri_month.html',
+                'adjacent': 1}),
     url(r'^calendar/compact_month/(?P<calendar_slug>[-\w]+)/$',
         calendar_by_periods, name="compact_calendar",
         kwargs={'periods': [Month],
@@ -1,13 +1,203 @@
 import datetime
 import heapq
+import operator
+from bisect import bisect_left
 from six.moves.builtins import object
 from functools import wraps
 from django.utils import timezone
 from django.http import HttpResponseRedirect
 from django.conf import settings
+from django.db.models import F, Prefetch
 from django.template import Context, loader
 from django.utils.module_loading import import_string
-from .settings import CHECK_PERMISSION_FUNC, CHECK_EVENT_PERM_FUNC, CHECK_CALENDAR_PERM_FUNC
+from .settings import (CHECK_PERMISSION_FUNC, CHECK_EVENT_PERM_FUNC, CHECK_CALENDAR_PERM_FUNC,
+                       PERSISTED_OCCURRENCE_CHUNK_DAYS)
+
+
+def occurrence_sort_key(occurrence):
+    """
+    The order of the occurrences of periods: by start, then by end, then by
+    event.
+    """
+    return (occurrence.start, occurrence.end, occurrence.event_id)
+
+
+def merge_occurrences(streams):
+    """
+    Lazily merges ``streams`` of occurrences, each sorted by
+    ``occurrence_sort_key``, into a single sorted stream.
+    """
+    for item in heapq.merge(*[_decorate(stream, n) for n, stream in enumerate(streams)]):
+        yield item[-1]
+
+
+def _decorate(stream, n):
+    # the stream and position break ties so that occurrences are never
+    # compared themselves
+    for position, occurrence in enumerate(stream):
+        yield occurrence_sort_key(occurrence), n, position, occurrence
+
+
+def _merge_occurrences_after(events, after, lower_bound=operator.attrgetter('start')):
+    """
+    Merges the occurrences after ``after`` of ``events`` like
+    ``merge_occurrences``. The events must come sorted by ``lower_bound``,
+    before which none of their occurrences starts, their start by default.
+    An event is only expanded once the merge reaches its lower bound, and
+    exhausted events leave the heap: taking the next few occurrences only
+    expands the events they come from and those whose bound is before them.
+    """
+    events = iter(events)
+    pending = next(events, None)
+    heap = []
+    n = 0
+    while True:
+        while pending is not None and (not heap or lower_bound(pending) <= heap[0][0][0][0]):
+            stream = _decorate(pending._occurrences_after_generator(after), n)
+            n += 1
+            item = next(stream, None)
+            if item is not None:
+                heapq.heappush(heap, (item, stream))
+            pending = next(events, None)
+        if not heap:
+            return
+        item, stream = heap[0]
+        yield item[-1]
+        item = next(stream, None)
+        if item is None:
+            heapq.heappop(heap)
+        else:
+            heapq.heapreplace(heap, (item, stream))
+
+
+def _unmoved(occurrences, occ_replacer):
+    """
+    Replaces the generated ``occurrences`` with their persisted counterparts,
+    leaving out those that were moved.
+    """
+    for occurrence in occurrences:
+        occurrence = occ_replacer.get_occurrence(occurrence)
+        if not occurrence.moved:
+            yield occurrence
+
+
+def iter_occurrences(events, start, end, budget=None):
+    """
+    Returns an iterator over the occurrences of ``events`` in the period
+    ``[start, end)``, as ``Event.get_occurrences`` would return them for each
+    of them, in ``occurrence_sort_key`` order. The persisted occurrences of
+    the events are taken from their prefetched ``occurrence_set`` when there
+    is one, and loaded with a single query for all the other events.
+
+    Events whose rule, duration and time zone match share one expansion:
+    once an event anchors a series, every later event starting on one of its
+    occurrences recurs on the rest of that series, so the anchor is expanded
+    up to the latest ``end_recurring_period`` of the group and each event
+    takes the part of it from its own start. Rules with a ``count`` are
+    expanded for each event, since their series end depends on the start.
+
+    The occurrences of events without persisted occurrences are only created
+    as the iterator reaches them. They stop at the limits of the ``budget``,
+    an ``ExpansionBudget`` which defaults to one with the limits of the
+    settings.
+    """
+    from events.recurrence import ExpansionBudget, expansion_memo
+    if budget is None:
+        budget = ExpansionBudget()
+    events = sorted(events, key=lambda e: e.start)
+    persisted = _persisted_by_event(events, start, end)
+    streams = []
+    groups = {}
+    for event in events:
+        seeker = event.get_rule_seeker()
+        if seeker is None or seeker.count is not None:
+            occurrences = event._replace_persisted(event._get_occurrence_list(start, end, budget), start, end,
+                                                   False, persisted.get(event.pk, []))
+            streams.append(sorted(occurrences, key=occurrence_sort_key))
+            continue
+        key = (event.rule_id, event.rule.frequency, event.rule.params,
+               event.end - event.start, event.start.tzinfo)
+        series = groups.setdefault(key, [])
+        for group in series:
+            if group[0].get_rule_seeker().after(seeker.dtstart, inc=True) == seeker.dtstart:
+                group.append(event)
+                break
+        else:
+            series.append([event])
+
+    for series in groups.values():
+        for group in series:
+            anchor = group[0]
+            duration = anchor.end - anchor.start
+            untils = [event.end_recurring_period for event in group]
+            until = None if None in untils else max(untils)
+            o_starts = list(budget.take(expansion_memo.expand(anchor.get_rule_seeker(), start, end, duration, until),
+                                        charge=False))
+            for event in group:
+                generated = budget.take(_generate(event, o_starts[bisect_left(o_starts, event.get_rule_seeker().dtstart):]))
+                if event.pk in persisted:
+                    generated = sorted(event._replace_persisted(list(generated), start, end, False,
+                                                                persisted[event.pk]),
+                                       key=occurrence_sort_key)
+                streams.append(generated)
+    return merge_occurrences(streams)
+
+
+def _persisted_by_event(events, start, end):
+    """
+    Returns the lists of persisted occurrences of ``events`` that matter for
+    the period ``[start, end)`` by event id, leaving out the events without
+    any.
+    """
+    from events.models import Occurrence
+    cache_name = Occurrence._meta.get_field('event').related_query_name()
+    persisted = {}
+    missing = []
+    for event in events:
+        prefetched = getattr(event, '_prefetched_objects_cache', {})
+        if cache_name in prefetched:
+            if prefetched[cache_name]:
+                persisted[event.pk] = list(prefetched[cache_name])
+        elif event.pk is not None:
+            missing.append(event.pk)
+    if missing:
+        occurrences = Occurrence.objects.in_window(start, end).filter(event__in=missing)
+        for occurrence in _with_events(occurrences, dict((event.pk, event) for event in events)):
+            persisted.setdefault(occurrence.event_id, []).append(occurrence)
+    return persisted
+
+
+def _with_events(occurrences, events):
+    """
+    Yields the instances of the ``occurrences`` QuerySet with their event set
+    to the one of ``events``, a dict by event id. ``Occurrence.__init__``
+    reads the title and description of the event of the occurrences without
+    their own, which would otherwise take a query for each of them, as
+    ``select_related`` only sets the event once the instance is created.
+    """
+    names = [field.attname for field in occurrences.model._meta.concrete_fields]
+    for values in occurrences.values_list(*names):
+        fields = dict(zip(names, values))
+        fields['event'] = events[fields.pop('event_id')]
+        occurrence = occurrences.model(**fields)
+        occurrence._state.adding = False
+        occurrence._state.db = occurrences.db
+        yield occurrence
+
+
+def _generate(event, o_starts):
+    duration = event.end - event.start
+    for o_start in o_starts:
+        if event.end_recurring_period and o_start > event.end_recurring_period:
+            return
+        yield event._create_occurrence(o_start, o_start + duration)
+
+
+def expand_occurrences(events, start, end, budget=None):
+    """
+    Returns the list of the occurrences ``iter_occurrences`` iterates over.
+    """
+    return list(iter_occurrences(events, start, end, budget))
 
 
 class EventListManager(object):
@@ -25,32 +215,48 @@ class EventListManager(object):
         events.  This function produces a generator that yields the
         the most recent occurrence after the date ``after`` from any of the
         events in ``self.events``
+
+        Persisted occurrences that were moved are read in order of their own
+        start by a query of their own, so that they come at their place even
+        when they were moved before the next generated occurrence of their
+        event, or from before ``after``.
         """
         from events.models import Occurrence
+        from events.models.event import NEXT_OCCURRENCE_MARGIN
         if after is None:
             after = timezone.now()
-        occ_replacer = OccurrenceReplacer(
-            Occurrence.objects.filter(event__in=self.events))
-        generators = [event._occurrences_after_generator(after) for event in self.events]
-        occurrences = []
-
-        for generator in generators:
-            try:
-                heapq.heappush(occurrences, (generator.next(), generator))
-            except StopIteration:
-                pass
-
-        while True:
-            if len(occurrences) == 0:
-                raise StopIteration
-
-            generator = occurrences[0][1]
+        events = self.events
+        if hasattr(events, 'possibly_overlapping'):
+            events = events.possibly_overlapping(after)
+        occ_replacer = OccurrenceReplacer(load_chunk=lambda start, end: Occurrence.objects.filter(
+            event__in=events, original_start__gte=start, original_start__lt=end))
+        moved = Occurrence.objects.filter(event__in=events, end__gt=after).exclude(
+            start=F('original_start'), end=F('original_end')).select_related('event').order_by('start', 'end', 'event')
+        if hasattr(events, 'upcoming') and after >= timezone.now() - NEXT_OCCURRENCE_MARGIN:
+            # the persisted next occurrences bound the occurrences after
+            # ``after``
+            merged = _merge_occurrences_after(events.upcoming().iterator(), after,
+                                              operator.attrgetter('next_occurrence_start'))
+        elif hasattr(events, 'order_by'):
+            merged = _merge_occurrences_after(events.order_by('start').iterator(), after)
+        else:
+            merged = _merge_occurrences_after(sorted(events, key=lambda event: event.start), after)
+        for occurrence in merge_occurrences([_unmoved(merged, occ_replacer), moved.iterator()]):
+            yield occurrence
 
-            try:
-                next_occurance = heapq.heapreplace(occurrences, (next(generator), generator))[0]
-            except StopIteration:
-                next_occurance = heapq.heappop(occurrences)[0]
-            yield occ_replacer.get_occurrence(next_occurance)
+    def occurrences_between(self, start, end):
+        """
+        Returns the sorted occurrences of ``self.events`` in the period
+        ``[start, end)``, expanding events that share a recurrence together.
+        """
+        events = self.events
+        if hasattr(events, 'possibly_overlapping'):
+            events = events.possibly_overlapping(start, end)
+        if hasattr(events, 'prefetch_related'):
+            from events.models import Occurrence
+            events = events.select_related('rule').prefetch_related(
+                Prefetch('occurrence_set', queryset=Occurrence.objects.in_window(start, end)))
+        return expand_occurrences(events, start, end)
 
 
 class OccurrenceReplacer(object):
@@ -59,29 +265,80 @@ class OccurrenceReplacer(object):
     before passing it forward is to make sure all of the occurrences that
     have been stored in the datebase replace, in the list you are returning,
     the generated ones that are equivalent.  This class makes this easier.
+
+    The persisted occurrences are also kept sorted by their current start,
+    so the ones moved into a period are found with bisect. Instead of
+    ``persisted_occurrences``, a ``load_chunk(start, end)`` function returning
+    those whose original start is in ``[start, end)`` may be given: chunks of
+    ``PERSISTED_OCCURRENCE_CHUNK_DAYS`` are then loaded as lookups move
+    forward, which they must do in order of original start. Only the last
+    chunk is kept, since the ones before can't match anymore.
     """
-    def __init__(self, persisted_occurrences):
-        lookup = [((occ.event_id, occ.original_start, occ.original_end), occ) for
-            occ in persisted_occurrences]
-        self.lookup = dict(lookup)
+    chunk_span = datetime.timedelta(days=PERSISTED_OCCURRENCE_CHUNK_DAYS)
+
+    def __init__(self, persisted_occurrences=(), load_chunk=None):
+        self.lookup = {}
+        self._by_start = []
+        self._starts = []
+        self._max_ends = []
+        self.load_chunk = load_chunk
+        self.loaded_until = None
+        self.add(persisted_occurrences)
+
+    def _key(self, occ):
+        return (occ.event_id, occ.original_start, occ.original_end)
+
+    def add(self, persisted_occurrences):
+        """
+        Adds ``persisted_occurrences`` to the ones replacing generated
+        occurrences.
+        """
+        added = len(self._by_start)
+        for occ in persisted_occurrences:
+            self.lookup[self._key(occ)] = occ
+            self._by_start.append(occ)
+        if len(self._by_start) == added:
+            return
+        self._by_start.sort(key=lambda occ: occ.start)
+        self._starts = [occ.start for occ in self._by_start]
+        self._max_ends = []
+        for occ in self._by_start:
+            end = occ.end
+            if self._max_ends and self._max_ends[-1] > end:
+                end = self._max_ends[-1]
+            self._max_ends.append(end)
+
+    def _load_through(self, original_start):
+        if self.load_chunk is None or (self.loaded_until is not None and original_start < self.loaded_until):
+            return
+        # nothing between the end of the last chunk and ``original_start`` can
+        # be looked up anymore, so the next chunk starts there
+        self.loaded_until = original_start + self.chunk_span
+        self.lookup = {}
+        self._by_start, self._starts, self._max_ends = [], [], []
+        self.add(self.load_chunk(original_start, self.loaded_until))
 
     def get_occurrence(self, occ):
         """
         Return a persisted occurrences matching the occ and remove it from lookup since it
         has already been matched
         """
-        return self.lookup.pop(
-            (occ.event_id, occ.original_start, occ.original_end),
-            occ)
+        self._load_through(occ.original_start)
+        return self.lookup.pop(self._key(occ), occ)
 
     def has_occurrence(self, occ):
-        return (occ.event_id, occ.original_start, occ.original_end) in self.lookup
+        self._load_through(occ.original_start)
+        return self._key(occ) in self.lookup
 
     def get_additional_occurrences(self, start, end):
         """
         Return persisted occurrences which are now in the period
         """
-        return [occ for key, occ in self.lookup.items() if (occ.start < end and occ.end >= start and not occ.cancelled)]
+        # every occurrence before ``first`` ends before ``start``
+        first = bisect_left(self._max_ends, start)
+        last = bisect_left(self._starts, end)
+        return [occ for occ in self._by_start[first:last]
+                if occ.end >= start and not occ.cancelled and self.lookup.get(self._key(occ)) is occ]
 
 
 def check_event_permissions(function):
@@ -185,6 +442,7 @@ def decode_occurrence(id):
 def serialize_occurrences(occurrences, user):
     occ_list = []
     for occ in occurrences:
+        occ = occ.promote()
         original_id = occ.id
         occ.id = encode_occurrence(occ)
         occ.start = occ.start.ctime()
@@ -6,11 +6,13 @@ from django.views.decorators.csrf import csrf_exempt
 from django.core.urlresolvers import reverse
 from django.shortcuts import get_object_or_404
 from django.contrib.contenttypes.models import ContentType
+from django.db.models.query import QuerySet
 from dateutil.tz import tzutc
 from events.jsonresponse import JSONResponse
 from events.models import Calendar, Event, CalendarRelation, EventRelation, Rule
 from events.periods import Period
-from events.settings import GET_EVENTS_FUNC
+from events.settings import GET_EVENTS_FUNC, SQL_EXPANSION_ENABLED
+from events.sql import SQLExpansion
 from events.utils import encode_occurrence
 from events.utils import model_to_dict
 from audience.settings import VALID_AUDIENCES, AUDIENCE_TYPES
@@ -53,9 +55,12 @@ def calendar_events(request, calendar_slug):
         end = end and datetime.datetime.fromtimestamp(int(end))
 
     events = GET_EVENTS_FUNC(request, calendar)
-    period = Period(events, start, end)
+    if SQL_EXPANSION_ENABLED and start and end and isinstance(events, QuerySet):
+        occurrences = SQLExpansion(events, start, end).get_occurrences()
+    else:
+        occurrences = Period(events, start, end).iter_occurrences()
     cal_events = []
-    for o in period.get_occurrences():
+    for o in occurrences:
         audience_bits = [x for x in o.event.appropriate_for.get_set_bits() if x in VALID_AUDIENCES]
         audiences = [AUDIENCE_TYPES[x]['name'][0] for x in audience_bits]
         if o.event.all_day:
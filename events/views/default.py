@@ -13,7 +13,7 @@ from events.settings import GET_EVENTS_FUNC, OCCURRENCE_CANCEL_REDIRECT
 from events.forms import EventForm, OccurrenceForm
 from events.forms import EventBackendForm, OccurrenceBackendForm
 from events.models import Event, Occurrence, Calendar
-from events.periods import weekday_names
+from events.periods import ExpansionContext, weekday_names
 from events.utils import check_event_permissions, coerce_date_dict
 from events.utils import decode_occurrence
 import datetime
@@ -44,7 +44,7 @@ def calendar(request, calendar_slug, template='events/calendar.html'):
 
 
 def calendar_by_periods(request, calendar_slug, periods=None,
-    template_name="events/calendar_by_period.html"):
+    template_name="events/calendar_by_period.html", adjacent=0):
     """
     This view is for getting a calendar, but also getting periods with that
     calendar.  Which periods you get, is designated with the list periods. You
@@ -78,6 +78,8 @@ def calendar_by_periods(request, calendar_slug, periods=None,
         This is for convenience. It returns the local names of weekedays for
         internationalization.
 
+    The occurrences of all the periods, and of ``adjacent`` periods before
+    and after each of them, are expanded together.
     """
     calendar = get_object_or_404(Calendar, slug=calendar_slug)
     date = coerce_date_dict(request.GET)
@@ -90,6 +92,7 @@ def calendar_by_periods(request, calendar_slug, periods=None,
         date = tz.now()
     event_list = GET_EVENTS_FUNC(request, calendar)
     period_objects = dict([(period.__name__.lower(), period(event_list, date)) for period in periods])
+    ExpansionContext.share(period_objects.values(), adjacent)
 
     return render_to_response(template_name, {
             'date': date,